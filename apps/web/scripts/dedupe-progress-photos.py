@@ -0,0 +1,394 @@
+#!/usr/bin/env python3
+"""
+Near-duplicate filter for bulk progress-photo imports
+
+Runs before upload or normalize-progress-photos.py, so a burst of almost
+identical mirror selfies becomes one photo instead of a dozen:
+
+    1. Every photo is decoded at a reduced scale (JPEG draft mode) and
+       reduced to a 64 bit pHash (low frequencies of a 32x32 DCT), a 64 bit
+       dHash (horizontal gradients of a 9x8 thumbnail), a sharpness value
+       (variance of the Laplacian) and an exposure value. DCTs run as one
+       matrix product per batch of photos.
+    2. Photos are ordered by capture time (EXIF DateTimeOriginal, else the
+       file modification time). A multi-index hash table holds the photos of
+       the last --window minutes; each new photo is linked to every photo in
+       it within --phash-distance and --dhash-distance bits.
+    3. Linked photos form clusters; the sharpest, best exposed photo of each
+       cluster is kept.
+
+Pixels never leave the workers, so memory grows by about a hundred bytes per
+photo (hashes, scores and the path) plus the photos inside one time window.
+
+Usage (with the vendored venv):
+    source venv/bin/activate
+    python scripts/dedupe-progress-photos.py INPUT_DIR [--output selection.json] [--link-dir DIR]
+"""
+
+import argparse
+import itertools
+import json
+import multiprocessing as mp
+import os
+import shutil
+import sys
+import time
+from collections import defaultdict, deque
+from datetime import datetime
+from typing import Dict, Iterable, Iterator, List, Set, Tuple
+
+import numpy as np
+from PIL import ExifTags, Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from progress_photos import iter_photos, load_oriented  # noqa: E402
+
+# Longest side of the image that sharpness and exposure are measured on
+ANALYSIS_SIZE = 256
+DCT_SIZE = 32
+HASH_SIZE = 8
+BATCH_SIZE = 32
+
+DEFAULT_WINDOW_MINUTES = 15.0
+DEFAULT_PHASH_DISTANCE = 10
+DEFAULT_DHASH_DISTANCE = 14
+
+# Pixels at or beyond these values count as clipped shadows / highlights
+CLIP_LEVELS = (3, 252)
+
+EXIF_DATETIME_ORIGINAL = 36867
+EXIF_DATETIME = 306
+
+
+def dct_matrix(n: int) -> np.ndarray:
+    """Orthonormal DCT-II basis; X -> D @ X @ D.T is the 2D transform"""
+    k = np.arange(n)[:, None]
+    x = np.arange(n)[None, :]
+    matrix = np.sqrt(2.0 / n) * np.cos(np.pi * (2 * x + 1) * k / (2 * n))
+    matrix[0] /= np.sqrt(2.0)
+    return matrix
+
+
+DCT = dct_matrix(DCT_SIZE)
+
+
+def pack_bits(bits: np.ndarray) -> np.ndarray:
+    """(N, 64) booleans -> (N,) uint64, first bit most significant"""
+    return np.packbits(bits.astype(np.uint8), axis=1).view('>u8').ravel().astype(np.uint64)
+
+
+def phash(thumbnails: np.ndarray) -> np.ndarray:
+    """pHash of a (N, 32, 32) stack: low 8x8 DCT frequencies above their median"""
+    low = (DCT @ thumbnails @ DCT.T)[:, :HASH_SIZE, :HASH_SIZE].reshape(len(thumbnails), -1)
+    return pack_bits(low > np.median(low, axis=1, keepdims=True))
+
+
+def dhash(thumbnails: np.ndarray) -> np.ndarray:
+    """dHash of a (N, 8, 9) stack: is each pixel brighter than its left neighbour"""
+    return pack_bits((thumbnails[:, :, 1:] > thumbnails[:, :, :-1]).reshape(len(thumbnails), -1))
+
+
+def sharpness(gray: np.ndarray) -> float:
+    """Variance of the 4-neighbour Laplacian; higher is sharper"""
+    laplacian = (gray[1:-1, :-2] + gray[1:-1, 2:] + gray[:-2, 1:-1] + gray[2:, 1:-1]
+                 - 4.0 * gray[1:-1, 1:-1])
+    return float(laplacian.var())
+
+
+def exposure(gray: np.ndarray) -> float:
+    """1 for a mid-gray mean with no clipping, falling towards 0.5 / 0"""
+    clipped = float(((gray <= CLIP_LEVELS[0]) | (gray >= CLIP_LEVELS[1])).mean())
+    return (1.0 - clipped) * (1.0 - abs(float(gray.mean()) / 255.0 - 0.5))
+
+
+def capture_time(path: str) -> float:
+    """EXIF capture time as a POSIX timestamp, falling back to the file mtime
+
+    EXIF times carry no zone and are read as local time, which is fine for
+    comparing photos from the same camera roll.
+    """
+    try:
+        with Image.open(path) as image:
+            exif = image.getexif()
+            value = exif.get_ifd(ExifTags.IFD.Exif).get(EXIF_DATETIME_ORIGINAL) or exif.get(EXIF_DATETIME)
+        if value:
+            return datetime.strptime(str(value).strip('\0 '), '%Y:%m:%d %H:%M:%S').timestamp()
+    except (OSError, ValueError):
+        pass
+    return os.path.getmtime(path)
+
+
+def analyze_batch(paths: List[str]) -> Tuple[Dict[str, np.ndarray], List[str], List[Tuple[str, str]], float]:
+    """Hash and score a batch of photos
+
+    Returns (columns, paths, errors, seconds) where columns holds one array
+    per field for the photos that decoded.
+    """
+    start = time.perf_counter()
+    ok_paths, errors = [], []
+    dct_inputs, gradient_inputs, times, sharp, exposed = [], [], [], [], []
+    for path in paths:
+        try:
+            image = load_oriented(path, (ANALYSIS_SIZE, ANALYSIS_SIZE)).convert('L')
+            image.thumbnail((ANALYSIS_SIZE, ANALYSIS_SIZE), Image.Resampling.BOX)
+            gray = np.asarray(image, dtype=np.float32)
+            dct_inputs.append(np.asarray(image.resize((DCT_SIZE, DCT_SIZE), Image.Resampling.BOX),
+                                         dtype=np.float32))
+            gradient_inputs.append(np.asarray(image.resize((HASH_SIZE + 1, HASH_SIZE), Image.Resampling.BOX),
+                                              dtype=np.float32))
+            times.append(capture_time(path))
+            sharp.append(sharpness(gray))
+            exposed.append(exposure(gray))
+            ok_paths.append(path)
+        except Exception as e:
+            errors.append((path, str(e)))
+
+    if not ok_paths:
+        return {}, [], errors, time.perf_counter() - start
+    columns = {
+        'phash': phash(np.stack(dct_inputs)),
+        'dhash': dhash(np.stack(gradient_inputs)),
+        'time': np.array(times, dtype=np.float64),
+        'sharpness': np.array(sharp, dtype=np.float32),
+        'exposure': np.array(exposed, dtype=np.float32),
+    }
+    return columns, ok_paths, errors, time.perf_counter() - start
+
+
+def batched(items: Iterable[str], size: int) -> Iterator[List[str]]:
+    iterator = iter(items)
+    while True:
+        batch = list(itertools.islice(iterator, size))
+        if not batch:
+            return
+        yield batch
+
+
+class MultiIndexHash:
+    """Multi-index hash table for Hamming range queries on 64 bit hashes
+
+    The hash is split into m = radius // 2 + 1 substrings, each with its own
+    table. If two hashes are within `radius` bits, at least one substring is
+    within radius // m bits (pigeonhole), so probing every key within that
+    small distance in each table finds all candidates. Entries are removed in
+    insertion order, which is what a sliding time window needs.
+    """
+
+    def __init__(self, radius: int, bits: int = 64):
+        self.chunks = radius // 2 + 1
+        self.sub_radius = radius // self.chunks
+        bounds = np.linspace(0, bits, self.chunks + 1).round().astype(int)
+        self.spans = [(int(lo), int(hi - lo)) for lo, hi in zip(bounds[:-1], bounds[1:])]
+        self.flips = [
+            [sum(1 << b for b in combo)
+             for r in range(self.sub_radius + 1) for combo in itertools.combinations(range(width), r)]
+            for _, width in self.spans
+        ]
+        self.tables: List[Dict[int, deque]] = [defaultdict(deque) for _ in self.spans]
+
+    def _keys(self, value: int) -> List[int]:
+        return [(value >> shift) & ((1 << width) - 1) for shift, width in self.spans]
+
+    def add(self, item: int, value: int):
+        for table, key in zip(self.tables, self._keys(value)):
+            table[key].append(item)
+
+    def remove_oldest(self, item: int, value: int):
+        for table, key in zip(self.tables, self._keys(value)):
+            bucket = table[key]
+            bucket.popleft()
+            if not bucket:
+                del table[key]
+
+    def candidates(self, value: int) -> Set[int]:
+        found = set()
+        for table, key, flips in zip(self.tables, self._keys(value), self.flips):
+            for flip in flips:
+                bucket = table.get(key ^ flip)
+                if bucket:
+                    found.update(bucket)
+        return found
+
+
+def cluster(times: np.ndarray, phashes: np.ndarray, dhashes: np.ndarray, window: float,
+            phash_distance: int, dhash_distance: int) -> Tuple[np.ndarray, int]:
+    """Label near-duplicates taken within `window` seconds of each other
+
+    Returns (labels, comparisons); photos with the same label form a cluster.
+    A window of 0 compares every photo with every other one.
+    """
+    order = np.argsort(times, kind='stable').tolist()
+    stamps = times.tolist()
+    p = [int(h) for h in phashes]
+    d = [int(h) for h in dhashes]
+    parent = list(range(len(p)))
+
+    def root(i: int) -> int:
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    index = MultiIndexHash(phash_distance)
+    oldest = 0
+    comparisons = 0
+    for i in order:
+        if window > 0:
+            while stamps[order[oldest]] < stamps[i] - window:
+                index.remove_oldest(order[oldest], p[order[oldest]])
+                oldest += 1
+        for j in index.candidates(p[i]):
+            comparisons += 1
+            if (p[i] ^ p[j]).bit_count() <= phash_distance and (d[i] ^ d[j]).bit_count() <= dhash_distance:
+                a, b = root(i), root(j)
+                if a != b:
+                    parent[max(a, b)] = min(a, b)
+        index.add(i, p[i])
+
+    return np.array([root(i) for i in range(len(p))], dtype=np.int64), comparisons
+
+
+def quality(sharp: np.ndarray, exposed: np.ndarray) -> np.ndarray:
+    """Score used to pick the photo kept from each cluster"""
+    return np.log1p(sharp.astype(np.float64)) * exposed
+
+
+def link_or_copy(source: str, destination: str):
+    os.makedirs(os.path.dirname(destination), exist_ok=True)
+    if os.path.exists(destination):
+        return
+    try:
+        os.link(source, destination)
+    except OSError:
+        shutil.copy2(source, destination)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Drop near-duplicate progress photos before a bulk import')
+    parser.add_argument('input_dir', help='Directory of original photos (searched recursively)')
+    parser.add_argument('--output', default='photo-selection.json',
+                        help='Selection report (default: photo-selection.json)')
+    parser.add_argument('--link-dir', help='Hard-link (or copy) the kept photos here, keeping relative paths')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--window', type=float, default=DEFAULT_WINDOW_MINUTES,
+                        help=f'Minutes within which photos can be duplicates, 0 for no limit '
+                             f'(default: {DEFAULT_WINDOW_MINUTES:g})')
+    parser.add_argument('--phash-distance', type=int, default=DEFAULT_PHASH_DISTANCE,
+                        help=f'Max pHash Hamming distance (default: {DEFAULT_PHASH_DISTANCE})')
+    parser.add_argument('--dhash-distance', type=int, default=DEFAULT_DHASH_DISTANCE,
+                        help=f'Max dHash Hamming distance (default: {DEFAULT_DHASH_DISTANCE})')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        print(f"Error: {args.input_dir} is not a directory")
+        return 1
+    if not 0 <= args.phash_distance < 64 or not 0 <= args.dhash_distance < 64:
+        print("Error: hash distances must be between 0 and 63")
+        return 1
+
+    # Pass 1: hashes and scores, streamed through the pool in batches
+    paths: List[str] = []
+    parts: Dict[str, List[np.ndarray]] = defaultdict(list)
+    failed = 0
+    busy_seconds = 0.0
+    start = time.perf_counter()
+
+    with mp.Pool(args.workers) as pool:
+        for columns, batch_paths, errors, seconds in pool.imap_unordered(
+                analyze_batch, batched(iter_photos(args.input_dir), BATCH_SIZE)):
+            busy_seconds += seconds
+            for path, error in errors:
+                failed += 1
+                print(f"  Failed: {path}: {error}")
+            if not batch_paths:
+                continue
+            paths.extend(batch_paths)
+            for name, values in columns.items():
+                parts[name].append(values)
+            if len(paths) // 1000 != (len(paths) - len(batch_paths)) // 1000:
+                print(f"  {len(paths) // 1000 * 1000} photos hashed...")
+
+    hash_seconds = time.perf_counter() - start
+    if not paths:
+        print(f"No photos found in {args.input_dir}" + (f" ({failed} failed)" if failed else ""))
+        return 1 if failed else 0
+    data = {name: np.concatenate(values) for name, values in parts.items()}
+    del parts
+
+    # Pass 2: clusters within the time window, best photo per cluster
+    start = time.perf_counter()
+    labels, comparisons = cluster(data['time'], data['phash'], data['dhash'], args.window * 60,
+                                  args.phash_distance, args.dhash_distance)
+    scores = quality(data['sharpness'], data['exposure'])
+    # Best score first within each cluster, clusters in capture order
+    order = np.lexsort((-scores, labels))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = labels[order[1:]] != labels[order[:-1]]
+    keep = order[first]
+    keep = keep[np.argsort(data['time'][keep], kind='stable')]
+    cluster_seconds = time.perf_counter() - start
+
+    members = defaultdict(list)
+    for i in order:
+        members[int(labels[i])].append(int(i))
+
+    def describe(i: int, reference: int) -> Dict:
+        return {
+            'path': os.path.relpath(paths[i], args.input_dir),
+            'taken_at': datetime.fromtimestamp(data['time'][i]).isoformat(timespec='seconds'),
+            'phash': f"{int(data['phash'][i]):016x}",
+            'phash_distance': (int(data['phash'][i]) ^ int(data['phash'][reference])).bit_count(),
+            'sharpness': round(float(data['sharpness'][i]), 1),
+            'exposure': round(float(data['exposure'][i]), 3),
+        }
+
+    clusters = []
+    for i in keep.tolist():
+        group = members[int(labels[i])]
+        if len(group) > 1:
+            clusters.append({
+                'keep': describe(i, i),
+                'duplicates': [describe(j, i) for j in group if j != i],
+            })
+
+    report = {
+        'settings': {
+            'window_minutes': args.window,
+            'phash_distance': args.phash_distance,
+            'dhash_distance': args.dhash_distance,
+        },
+        'photos': len(paths),
+        'kept': len(keep),
+        'failed': failed,
+        'selected': [os.path.relpath(paths[i], args.input_dir) for i in keep.tolist()],
+        'clusters': clusters,
+    }
+    with open(args.output, 'w') as f:
+        json.dump(report, f, indent=2)
+
+    if args.link_dir:
+        for i in keep.tolist():
+            link_or_copy(paths[i], os.path.join(args.link_dir, os.path.relpath(paths[i], args.input_dir)))
+
+    total = len(paths)
+    removed = total - len(keep)
+    cores = min(args.workers, os.cpu_count() or args.workers)
+    print(f"\n{'=' * 60}")
+    print("Summary:")
+    print(f"  Photos: {total} hashed, {failed} failed")
+    print(f"  Hashing: {hash_seconds:.2f}s with {args.workers} worker(s) on {cores} core(s), "
+          f"{total / hash_seconds:.1f} photos/s ({total / hash_seconds / cores:.1f} per core)")
+    print(f"  Mean time per photo: {busy_seconds / total * 1000:.1f} ms")
+    print(f"  Clustering: {cluster_seconds:.2f}s, {comparisons} candidate pairs checked")
+    print(f"  Duplicate clusters: {len(clusters)} "
+          f"(largest {max((len(c['duplicates']) + 1 for c in clusters), default=0)} photos)")
+    print(f"  Kept: {len(keep)}, dropped: {removed} (dedupe ratio {removed / total:.1%})")
+    print(f"\nSelection written to {args.output}")
+    if args.link_dir:
+        print(f"Kept photos linked into {args.link_dir}")
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,147 @@
+#!/usr/bin/env python3
+"""
+Export SMPL-X morph targets so the client can blend any body composition
+
+Evaluates the four corner compositions of the calibrated BF% / FFMI range per
+gender, derives a base mesh plus bf, ffmi and bf x ffmi delta bases, and
+writes them as int16 (or float16) buffers with a shared uint16 index buffer
+(format described in smplx_morphs.py). The file is then decoded with the NumPy
+reference decoder and checked against the body model on the full bracket grid.
+
+Usage:
+    python scripts/export-smplx-morphs.py [--dtype int16|float16]
+"""
+
+import argparse
+import gzip
+import json
+import os
+import sys
+import time
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from smplx_avatar import (  # noqa: E402
+    BODY_FAT_VALUES,
+    FFMI_VALUES,
+    GENDERS,
+    MANIFEST_NAME,
+    MODEL_DIR,
+    OUTPUT_DIR,
+    ShapeMapper,
+    avatar_grid,
+    evaluate_shapes,
+    format_bytes,
+    model_file,
+)
+from smplx_morphs import blend, decode, encode  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Export SMPL-X morph targets for client-side blending')
+    parser.add_argument('--model-dir', default=MODEL_DIR, help=f'Directory with SMPLX_*.npz (default: {MODEL_DIR})')
+    parser.add_argument('--output', default=os.path.join(OUTPUT_DIR, 'avatar-morphs.bin'),
+                        help='Output file (default: public/avatars-smplx/avatar-morphs.bin)')
+    parser.add_argument('--png-dir', default=OUTPUT_DIR, help='Rendered avatar set (with avatar-manifest.json) to compare the payload against')
+    parser.add_argument('--dtype', default='int16', choices=['int16', 'float16'], help='Delta storage type')
+    parser.add_argument('--genders', nargs='+', default=GENDERS, choices=GENDERS, help='Genders to export')
+    args = parser.parse_args()
+
+    missing = [model_file(g, args.model_dir) for g in args.genders
+               if not os.path.exists(model_file(g, args.model_dir))]
+    if missing:
+        print("Error: SMPL-X models not found:")
+        for path in missing:
+            print(f"  {path}")
+        print("Download them from https://smpl-x.is.tue.mpg.de/ (see SMPLX_AVATAR_GUIDE.md)")
+        return 1
+
+    start = time.perf_counter()
+    mapper = ShapeMapper()
+    ranges = {
+        'bf': [BODY_FAT_VALUES[0], BODY_FAT_VALUES[-1]],
+        'ffmi': [FFMI_VALUES[0], FFMI_VALUES[-1]],
+    }
+    # (u, w) = (0, 0), (1, 0), (0, 1), (1, 1)
+    corner_bf = np.array([ranges['bf'][0], ranges['bf'][1], ranges['bf'][0], ranges['bf'][1]], dtype=np.float64)
+    corner_ffmi = np.array([ranges['ffmi'][0], ranges['ffmi'][0], ranges['ffmi'][1], ranges['ffmi'][1]],
+                           dtype=np.float64)
+
+    meshes = {}
+    reference = {}
+    faces = None
+    for gender in args.genders:
+        grid = avatar_grid(genders=[gender])
+        grid_bf = np.array([bf for _, _, bf in grid], dtype=np.float64)
+        grid_ffmi = np.array([f for _, f, _ in grid], dtype=np.float64)
+
+        betas = mapper.betas(np.concatenate([corner_bf, grid_bf]), np.concatenate([corner_ffmi, grid_ffmi]))
+        if np.abs(betas[:4]).max() >= 5.0:
+            print(f"Warning: {gender} corner shapes hit the beta clamp, blending will not be exact")
+
+        # Corners and the verification grid in one forward pass
+        vertices, gender_faces = evaluate_shapes(gender, betas, args.model_dir)
+        if faces is None:
+            faces = gender_faces
+        elif not np.array_equal(faces, gender_faces):
+            print("Error: SMPL-X models for different genders have different topologies")
+            return 1
+
+        v00, v10, v01, v11 = vertices[:4].astype(np.float64)
+        meshes[gender] = {
+            'base': v00,
+            'bf': v10 - v00,
+            'ffmi': v01 - v00,
+            'bf_ffmi': v11 - v10 - v01 + v00,
+        }
+        reference[gender] = [(bf, f, vertices[4 + i]) for i, (_, f, bf) in enumerate(grid)]
+
+    data = encode(meshes, faces, ranges, dtype=args.dtype, metadata={'units': 'meters'})
+    os.makedirs(os.path.dirname(os.path.abspath(args.output)), exist_ok=True)
+    with open(args.output, 'wb') as f:
+        f.write(data)
+
+    # Verify the written file with the reference decoder
+    morphs = decode(data)
+    max_error = 0.0
+    for gender, samples in reference.items():
+        for bf, ffmi, expected in samples:
+            error = np.linalg.norm(blend(morphs, gender, bf, ffmi) - expected, axis=1).max()
+            max_error = max(max_error, float(error))
+
+    # Only the avatars themselves; sprite atlases share the directory
+    manifest_path = os.path.join(args.png_dir, MANIFEST_NAME)
+    png_files = []
+    if os.path.exists(manifest_path):
+        with open(manifest_path, 'r') as f:
+            entries = json.load(f).get('entries', {})
+        png_files = [p for p in (os.path.join(args.png_dir, rel) for rel in entries) if os.path.exists(p)]
+    png_bytes = sum(os.path.getsize(p) for p in png_files)
+    gzipped = len(gzip.compress(data, compresslevel=9))
+
+    print(f"\n{'=' * 60}")
+    print("Summary:")
+    print(f"  Vertices: {morphs['header']['vertex_count']}, triangles: {len(morphs['faces'])}")
+    print(f"  Delta type: {args.dtype}")
+    for gender, info in morphs['header']['genders'].items():
+        bounds = ', '.join(f"{name} {entry['error_bound'] * 1000:.3f}"
+                           for name, entry in info['bases'].items())
+        print(f"  {gender} error bounds (mm): {bounds}; total {info['error_bound'] * 1000:.3f}")
+    bound = max(info['error_bound'] for info in morphs['header']['genders'].values())
+    print(f"  Max vertex error on the bracket grid: {max_error * 1000:.3f} mm "
+          f"({'within' if max_error <= bound else 'EXCEEDS'} the {bound * 1000:.3f} mm bound)")
+    print(f"  Morph payload: {format_bytes(len(data))} ({format_bytes(gzipped)} gzipped)")
+    if png_files:
+        print(f"  PNG set: {format_bytes(png_bytes)} in {len(png_files)} files "
+              f"({png_bytes / len(data):.1f}x the morph payload)")
+    else:
+        print(f"  PNG set: no avatars listed in {manifest_path}")
+    print(f"  Time: {time.perf_counter() - start:.2f}s")
+    print(f"\nMorph targets written to {args.output}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
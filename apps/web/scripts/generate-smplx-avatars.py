@@ -0,0 +1,227 @@
+#!/usr/bin/env python3
+"""
+Generate SMPL-X wireframe avatars for every gender / FFMI / body fat bracket
+
+All shapes of a gender are evaluated in one batched SMPL-X forward pass on CPU,
+then rendered by a pool of worker processes that each keep one headless
+pyrender renderer alive. avatar-manifest.json records a render key (hash of
+shape parameters, style, resolution and model) and the content hash of every
+image, so re-running only renders avatars whose inputs or files changed.
+
+Usage:
+    python scripts/generate-smplx-avatars.py [--workers 4] [--force]
+"""
+
+import argparse
+import json
+import multiprocessing as mp
+import os
+import sys
+import time
+from datetime import datetime, timezone
+from typing import Dict, List, Tuple
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from smplx_avatar import (  # noqa: E402
+    DEFAULT_RESOLUTION,
+    DEFAULT_STYLE,
+    GENDERS,
+    MANIFEST_NAME,
+    MODEL_DIR,
+    OUTPUT_DIR,
+    ShapeMapper,
+    WireframeRenderer,
+    avatar_grid,
+    avatar_relpath,
+    evaluate_shapes,
+    file_sha256,
+    init_render_worker,
+    model_file,
+    model_id,
+    render_job,
+    render_key,
+)
+
+
+def load_manifest(path: str) -> Dict:
+    if not os.path.exists(path):
+        return {}
+    try:
+        with open(path, 'r') as f:
+            return json.load(f)
+    except (OSError, json.JSONDecodeError) as e:
+        print(f"Warning: ignoring unreadable manifest {path}: {e}")
+        return {}
+
+
+def is_up_to_date(entry: Dict, key: str, path: str) -> bool:
+    """An avatar can be reused if its inputs and its file are unchanged"""
+    if not entry or entry.get('render_key') != key or not os.path.exists(path):
+        return False
+    return entry.get('sha256') == file_sha256(path)
+
+
+def build_manifest(entries: Dict[str, Dict], mapper: ShapeMapper, style: Dict,
+                   resolution: Tuple[int, int]) -> Dict:
+    avatars: Dict[str, Dict[str, Dict[str, str]]] = {}
+    for relpath, entry in sorted(entries.items()):
+        ffmi_key = f"ffmi{entry['ffmi']:g}"
+        bf_key = f"bf{entry['body_fat']:g}"
+        avatars.setdefault(entry['gender'], {}).setdefault(ffmi_key, {})[bf_key] = relpath
+
+    return {
+        'version': 1,
+        'generated_at': datetime.now(timezone.utc).isoformat(),
+        'resolution': list(resolution),
+        'style': style,
+        'mapping': mapper.fingerprint(),
+        'avatars': avatars,
+        'entries': entries,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Generate SMPL-X wireframe avatars')
+    parser.add_argument('--model-dir', default=MODEL_DIR, help=f'Directory with SMPLX_*.npz (default: {MODEL_DIR})')
+    parser.add_argument('--output-dir', default=OUTPUT_DIR, help=f'Output directory (default: {OUTPUT_DIR})')
+    parser.add_argument('--genders', nargs='+', default=GENDERS, choices=GENDERS, help='Genders to generate')
+    parser.add_argument('--resolution', default='x'.join(map(str, DEFAULT_RESOLUTION)),
+                        help='Image size as WIDTHxHEIGHT (default: 512x640)')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Render worker processes')
+    parser.add_argument('--platform', default='osmesa', choices=['osmesa', 'egl'],
+                        help='Headless OpenGL platform for pyrender (default: osmesa)')
+    parser.add_argument('--force', action='store_true', help='Re-render every avatar')
+    args = parser.parse_args()
+
+    resolution = tuple(int(v) for v in args.resolution.lower().split('x'))
+    style = dict(DEFAULT_STYLE)
+
+    missing = [model_file(g, args.model_dir) for g in args.genders
+               if not os.path.exists(model_file(g, args.model_dir))]
+    if missing:
+        print("Error: SMPL-X models not found:")
+        for path in missing:
+            print(f"  {path}")
+        print("Download them from https://smpl-x.is.tue.mpg.de/ (see SMPLX_AVATAR_GUIDE.md)")
+        return 1
+
+    total_start = time.perf_counter()
+    manifest_path = os.path.join(args.output_dir, MANIFEST_NAME)
+    previous_manifest = load_manifest(manifest_path)
+    previous = previous_manifest.get('entries', {})
+    mapper = ShapeMapper()
+
+    # Genders that are not regenerated keep their existing entries
+    entries: Dict[str, Dict] = {
+        relpath: entry for relpath, entry in previous.items() if entry.get('gender') not in args.genders
+    }
+    if args.force:
+        previous = {}
+    jobs: List[Tuple[str, np.ndarray]] = []
+    faces = None
+    shape_seconds = 0.0
+
+    for gender in args.genders:
+        grid = avatar_grid(genders=[gender])
+        body_fat = np.array([bf for _, _, bf in grid])
+        ffmi = np.array([f for _, f, _ in grid])
+        betas = mapper.betas(body_fat, ffmi)
+        gender_model = model_id(gender, args.model_dir)
+
+        stale = []
+        for i, (_, f, bf) in enumerate(grid):
+            relpath = avatar_relpath(gender, f, bf)
+            key = render_key(gender, betas[i], style, resolution, gender_model)
+            entries[relpath] = {
+                'gender': gender,
+                'ffmi': f,
+                'body_fat': bf,
+                'betas': [round(float(b), 6) for b in betas[i]],
+                'render_key': key,
+            }
+            entry = previous.get(relpath, {})
+            if is_up_to_date(entry, key, os.path.join(args.output_dir, relpath)):
+                entries[relpath].update(sha256=entry['sha256'], render_seconds=entry.get('render_seconds'))
+            else:
+                stale.append(i)
+
+        print(f"{gender}: {len(grid) - len(stale)} up to date, {len(stale)} to render")
+        if not stale:
+            continue
+
+        # One forward pass for all stale shapes of this gender
+        start = time.perf_counter()
+        vertices, gender_faces = evaluate_shapes(gender, betas[stale], args.model_dir, style['shoulder_angle'])
+        elapsed = time.perf_counter() - start
+        shape_seconds += elapsed
+        print(f"  Evaluated {len(stale)} shapes in {elapsed:.2f}s")
+
+        if faces is None:
+            faces = gender_faces
+        elif not np.array_equal(faces, gender_faces):
+            print("Error: SMPL-X models for different genders have different topologies")
+            return 1
+
+        for row, i in enumerate(stale):
+            _, f, bf = grid[i]
+            jobs.append((os.path.join(args.output_dir, avatar_relpath(gender, f, bf)), vertices[row]))
+
+    render_seconds = 0.0
+    per_avatar: List[float] = []
+    if jobs:
+        # Pool respawns a worker whose initializer raises, forever, so make
+        # sure a headless GL context can be created before starting one
+        try:
+            WireframeRenderer(faces, style, resolution, args.platform).close()
+        except Exception as e:
+            print(f"Error: could not create a headless {args.platform} renderer: {e}")
+            if args.platform == 'osmesa':
+                print("Install OSMesa: conda install -c conda-forge osmesa (or use --platform egl)")
+            return 1
+
+        workers = max(1, min(args.workers, len(jobs)))
+        print(f"\nRendering {len(jobs)} avatars with {workers} worker(s)...")
+        render_start = time.perf_counter()
+        # spawn: OpenGL contexts and torch threads do not survive fork reliably
+        ctx = mp.get_context('spawn')
+        with ctx.Pool(workers, initializer=init_render_worker,
+                      initargs=(faces, style, resolution, args.platform)) as pool:
+            for done, (path, seconds) in enumerate(pool.imap_unordered(render_job, jobs), 1):
+                relpath = os.path.relpath(path, args.output_dir).replace(os.sep, '/')
+                entries[relpath].update(sha256=file_sha256(path), render_seconds=round(seconds, 3))
+                per_avatar.append(seconds)
+                print(f"  [{done}/{len(jobs)}] {relpath} ({seconds:.2f}s)")
+        render_seconds = time.perf_counter() - render_start
+
+    manifest = build_manifest(entries, mapper, style, resolution)
+    # Sprite atlases (package-smplx-avatars.py) stay valid until a frame changes
+    if not jobs:
+        for key in ('atlases', 'atlas_crop'):
+            if key in previous_manifest:
+                manifest[key] = previous_manifest[key]
+
+    os.makedirs(args.output_dir, exist_ok=True)
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    total_seconds = time.perf_counter() - total_start
+
+    print(f"\n{'=' * 60}")
+    print("Summary:")
+    print(f"  Avatars: {len(entries)}")
+    print(f"  Rendered: {len(jobs)}")
+    print(f"  Skipped (up to date): {len(entries) - len(jobs)}")
+    print(f"  Shape evaluation: {shape_seconds:.2f}s")
+    if per_avatar:
+        print(f"  Rendering: {render_seconds:.2f}s wall, "
+              f"{np.mean(per_avatar):.2f}s mean / {np.max(per_avatar):.2f}s max per avatar")
+    print(f"  Total wall time: {total_seconds:.2f}s")
+    print(f"\nManifest written to {manifest_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,239 @@
+#!/usr/bin/env python3
+"""
+Batch progress-photo normalizer
+
+Local equivalent of the Cloudinary chain in
+supabase/functions/process-progress-photo/index.ts, for bulk imports and
+backfills where one remote round trip per photo is too slow:
+
+    a_auto_right                          EXIF orientation
+    g_auto:subject                        crop to the alpha bounding box
+    z_0.85, c_pad, w_600, h_800           fit into 85% of 600x800, pad
+    b_rgb:000000, fl_preserve_transparency black padding, alpha kept
+    e_auto_brightness/contrast/color      auto-levels on subject pixels
+    f_webp, q_auto:best, fl_lossy         lossy WebP with alpha
+
+Photos are streamed from a directory tree through a process pool. JPEGs are
+decoded in draft mode at the smallest scale that still covers the output, so
+memory per worker stays bounded by the output size rather than the camera
+resolution.
+
+Usage (with the vendored venv):
+    source venv/bin/activate
+    python scripts/normalize-progress-photos.py INPUT_DIR OUTPUT_DIR [--workers 4]
+"""
+
+import argparse
+import multiprocessing as mp
+import os
+import sys
+import time
+from typing import Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from progress_photos import iter_photos, load_oriented  # noqa: E402
+
+TARGET_SIZE = (600, 800)
+ZOOM = 0.85
+BACKGROUND = (0, 0, 0)
+WEBP_QUALITY = 90  # q_auto:best
+
+# Percentiles used for the contrast stretch, and limits for the contrast,
+# color and brightness corrections so unusual photos are not pushed too far
+LEVELS_PERCENTILES = (0.5, 99.5)
+MAX_CONTRAST_GAIN = 2.5
+COLOR_GAIN_LIMITS = (0.8, 1.25)
+GAMMA_LIMITS = (0.6, 1.6)
+# Statistics are computed on at most this many subject pixels
+LEVELS_SAMPLE = 200_000
+
+
+def subject_bbox(image: Image.Image, threshold: int) -> Optional[Tuple[int, int, int, int]]:
+    """Bounding box of the subject in a background-removed photo
+
+    Photos arrive with the background already removed on device, so the
+    subject is everything with alpha above the threshold. Opaque photos have
+    no detectable subject and keep their full frame.
+    """
+    if image.mode != 'RGBA':
+        return None
+    alpha = np.asarray(image.getchannel('A'))
+    rows = np.flatnonzero((alpha > threshold).any(axis=1))
+    cols = np.flatnonzero((alpha > threshold).any(axis=0))
+    if rows.size == 0:
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def fit(image: Image.Image, size: Tuple[int, int], zoom: float) -> Image.Image:
+    """Scale to fit inside zoom * size, keeping the aspect ratio"""
+    box_w, box_h = size[0] * zoom, size[1] * zoom
+    scale = min(box_w / image.width, box_h / image.height)
+    new_size = (max(1, round(image.width * scale)), max(1, round(image.height * scale)))
+    if new_size == image.size:
+        return image
+    return image.resize(new_size, Image.Resampling.LANCZOS, reducing_gap=2.0)
+
+
+def auto_levels(pixels: np.ndarray, mask: Optional[np.ndarray]) -> np.ndarray:
+    """Auto contrast, color and brightness as one per-channel lookup table
+
+    Statistics come from subject pixels only (mask), so padding and removed
+    background do not skew them. Returns a (3, 256) uint8 LUT.
+    """
+    rgb = pixels[..., :3].reshape(-1, 3) if mask is None else pixels[..., :3][mask]
+    if len(rgb) > LEVELS_SAMPLE:
+        rgb = rgb[::len(rgb) // LEVELS_SAMPLE + 1]
+    if len(rgb) == 0:
+        return np.tile(np.arange(256, dtype=np.uint8), (3, 1))
+
+    values = np.arange(256, dtype=np.float64) / 255.0
+    rgb = rgb.astype(np.float64) / 255.0
+    luminance = rgb @ np.array([0.299, 0.587, 0.114])
+
+    # e_auto_contrast: stretch the luminance range to [0, 1]
+    low, high = np.percentile(luminance, LEVELS_PERCENTILES)
+    if high - low < 1 / MAX_CONTRAST_GAIN:
+        # Low-contrast subject: stretch around its midtone, but only so far
+        middle = float(np.clip((low + high) / 2, 0.5 / MAX_CONTRAST_GAIN, 1 - 0.5 / MAX_CONTRAST_GAIN))
+        low, high = middle - 0.5 / MAX_CONTRAST_GAIN, middle + 0.5 / MAX_CONTRAST_GAIN
+    stretched = np.clip((rgb - low) / (high - low), 0.0, 1.0)
+
+    # e_auto_color: gray-world balance of the channel means
+    means = stretched.mean(axis=0)
+    gains = np.clip(means.mean() / np.maximum(means, 1e-3), *COLOR_GAIN_LIMITS)
+    balanced = np.clip(stretched * gains, 0.0, 1.0)
+
+    # e_auto_brightness: gamma that moves mean luminance to mid-gray
+    mean_luminance = float(np.clip(balanced @ np.array([0.299, 0.587, 0.114]), 1e-3, 1 - 1e-3).mean())
+    gamma = float(np.clip(np.log(0.5) / np.log(mean_luminance), *GAMMA_LIMITS))
+
+    curves = np.clip((values[None, :] - low) / (high - low), 0.0, 1.0) * gains[:, None]
+    curves = np.clip(curves, 0.0, 1.0) ** gamma
+    return np.round(curves * 255).astype(np.uint8)
+
+
+def normalize(image: Image.Image, size: Tuple[int, int] = TARGET_SIZE, zoom: float = ZOOM,
+              alpha_threshold: int = 16) -> Image.Image:
+    """Apply the transform chain to an upright image"""
+    bbox = subject_bbox(image, alpha_threshold)
+    if bbox is not None:
+        image = image.crop(bbox)
+    image = fit(image, size, zoom)
+
+    pixels = np.array(image)
+    mask = pixels[..., 3] > alpha_threshold if image.mode == 'RGBA' else None
+    lut = auto_levels(pixels, mask)
+    for channel in range(3):
+        pixels[..., channel] = lut[channel][pixels[..., channel]]
+
+    has_alpha = image.mode == 'RGBA'
+    canvas = Image.new(image.mode, size, BACKGROUND + ((0,) if has_alpha else ()))
+    offset = ((size[0] - image.width) // 2, (size[1] - image.height) // 2)
+    canvas.paste(Image.fromarray(pixels, image.mode), offset)
+    return canvas
+
+
+def process_photo(job: Tuple[str, str, int, bool]) -> Tuple[str, int, int, float, Optional[str]]:
+    """Normalize one photo; returns (source, input bytes, output bytes, seconds, error)"""
+    source, destination, quality, force = job
+    start = time.perf_counter()
+    try:
+        if not force and os.path.exists(destination):
+            return source, os.path.getsize(source), os.path.getsize(destination), 0.0, 'skipped'
+        result = normalize(load_oriented(source, TARGET_SIZE))
+        os.makedirs(os.path.dirname(destination), exist_ok=True)
+        tmp = f"{destination}.tmp"
+        result.save(tmp, 'WEBP', quality=quality, method=4, alpha_quality=100)
+        os.replace(tmp, destination)
+        return source, os.path.getsize(source), os.path.getsize(destination), time.perf_counter() - start, None
+    except Exception as e:
+        return source, 0, 0, time.perf_counter() - start, str(e)
+
+
+def reference_sizes(reference_dir: str):
+    """Map relative path without extension -> size of the Cloudinary output"""
+    sizes = {}
+    for path in iter_photos(reference_dir):
+        relative = os.path.splitext(os.path.relpath(path, reference_dir))[0]
+        sizes[relative] = os.path.getsize(path)
+    return sizes
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Normalize progress photos like the Cloudinary pipeline')
+    parser.add_argument('input_dir', help='Directory of original photos (searched recursively)')
+    parser.add_argument('output_dir', help='Directory for the normalized WebP files')
+    parser.add_argument('--workers', type=int, default=os.cpu_count() or 1, help='Worker processes')
+    parser.add_argument('--quality', type=int, default=WEBP_QUALITY, help=f'WebP quality (default: {WEBP_QUALITY})')
+    parser.add_argument('--reference-dir',
+                        help='Cloudinary outputs with the same relative names, for output size parity')
+    parser.add_argument('--force', action='store_true', help='Overwrite existing outputs')
+    args = parser.parse_args()
+
+    if not os.path.isdir(args.input_dir):
+        print(f"Error: {args.input_dir} is not a directory")
+        return 1
+
+    def jobs():
+        for source in iter_photos(args.input_dir):
+            relative = os.path.splitext(os.path.relpath(source, args.input_dir))[0]
+            yield source, os.path.join(args.output_dir, relative + '.webp'), args.quality, args.force
+
+    processed = skipped = failed = 0
+    input_bytes = output_bytes = 0
+    busy_seconds = 0.0
+    outputs = {}
+    start = time.perf_counter()
+
+    with mp.Pool(args.workers) as pool:
+        for source, in_size, out_size, seconds, error in pool.imap_unordered(process_photo, jobs(), chunksize=4):
+            if error == 'skipped':
+                skipped += 1
+                continue
+            if error:
+                failed += 1
+                print(f"  Failed: {source}: {error}")
+                continue
+            processed += 1
+            input_bytes += in_size
+            output_bytes += out_size
+            busy_seconds += seconds
+            outputs[os.path.splitext(os.path.relpath(source, args.input_dir))[0]] = out_size
+            if processed % 100 == 0:
+                print(f"  {processed} photos...")
+
+    wall_seconds = time.perf_counter() - start
+
+    print(f"\n{'=' * 60}")
+    print("Summary:")
+    print(f"  Processed: {processed}")
+    print(f"  Skipped (already normalized): {skipped}")
+    print(f"  Failed: {failed}")
+    if processed:
+        cores = min(args.workers, os.cpu_count() or args.workers)
+        print(f"  Wall time: {wall_seconds:.2f}s with {args.workers} worker(s) on {cores} core(s)")
+        print(f"  Throughput: {processed / wall_seconds:.1f} photos/s, "
+              f"{processed / wall_seconds / cores:.2f} photos/s per core")
+        print(f"  Mean time per photo: {busy_seconds / processed * 1000:.0f} ms")
+        print(f"  Bytes: {input_bytes / 1e6:.1f} MB in, {output_bytes / 1e6:.1f} MB out")
+
+    if args.reference_dir and outputs:
+        references = reference_sizes(args.reference_dir)
+        ratios = np.array([outputs[name] / references[name] for name in outputs if references.get(name)])
+        if ratios.size:
+            print(f"  Size parity vs Cloudinary ({ratios.size} photos): "
+                  f"median {np.median(ratios):.2f}x, mean {ratios.mean():.2f}x, "
+                  f"range {ratios.min():.2f}x-{ratios.max():.2f}x")
+        else:
+            print(f"  Size parity: no matching files in {args.reference_dir}")
+
+    return 1 if failed else 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,204 @@
+#!/usr/bin/env python3
+"""
+Package SMPL-X avatar renders into per-row sprite atlases
+
+Every render is cropped to one bounding box shared by the whole set (the
+union of all non-background pixels), and each gender / FFMI row of body fat
+frames is packed side by side into a single image. Atlases are written as
+lossless WebP and as palette-quantized PNG, and their frame coordinates are
+added to avatar-manifest.json under "atlases", so a timeline that scrubs
+through body fat values needs one request per row instead of one per avatar.
+
+Usage:
+    python scripts/package-smplx-avatars.py [--avatar-dir public/avatars-smplx]
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import sys
+import time
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+from PIL import Image
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from smplx_avatar import MANIFEST_NAME, OUTPUT_DIR, file_sha256, format_bytes  # noqa: E402
+
+# Bump when the packing changes in a way the options do not capture
+PACKAGE_VERSION = 1
+
+Box = Tuple[int, int, int, int]  # left, top, right, bottom
+
+
+def content_bbox(image: np.ndarray, tolerance: int) -> Optional[Box]:
+    """Bounding box of pixels that differ from the background
+
+    The background is the top-left pixel, which covers both transparent and
+    solid (e.g. dark) backgrounds.
+    """
+    background = image[0, 0].astype(np.int16)
+    mask = (np.abs(image.astype(np.int16) - background) > tolerance).any(axis=2)
+    rows = np.flatnonzero(mask.any(axis=1))
+    cols = np.flatnonzero(mask.any(axis=0))
+    if rows.size == 0:
+        return None
+    return int(cols[0]), int(rows[0]), int(cols[-1]) + 1, int(rows[-1]) + 1
+
+
+def union_bbox(boxes: List[Box], size: Tuple[int, int], padding: int) -> Box:
+    """Smallest box containing all boxes, padded and clipped to the image"""
+    width, height = size
+    if not boxes:
+        return 0, 0, width, height
+    left, top, right, bottom = np.array(boxes).T
+    return (max(0, int(left.min()) - padding), max(0, int(top.min()) - padding),
+            min(width, int(right.max()) + padding), min(height, int(bottom.max()) + padding))
+
+
+def load_rgba(path: str) -> np.ndarray:
+    with Image.open(path) as image:
+        return np.asarray(image.convert('RGBA'))
+
+
+def body_fat_of(bf_key: str) -> float:
+    """'bf17.5' -> 17.5"""
+    return float(bf_key[len('bf'):])
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Pack SMPL-X avatar renders into sprite atlases')
+    parser.add_argument('--avatar-dir', default=OUTPUT_DIR, help=f'Directory with {MANIFEST_NAME} (default: {OUTPUT_DIR})')
+    parser.add_argument('--atlas-dir', default='atlas', help='Atlas directory, relative to --avatar-dir (default: atlas)')
+    parser.add_argument('--padding', type=int, default=4, help='Pixels kept around the shared bounding box (default: 4)')
+    parser.add_argument('--tolerance', type=int, default=8,
+                        help='Max channel difference still counted as background (default: 8)')
+    parser.add_argument('--colors', type=int, default=256, help='Palette size of the PNG atlases (default: 256)')
+    parser.add_argument('--force', action='store_true', help='Rebuild atlases even if their sources are unchanged')
+    args = parser.parse_args()
+
+    manifest_path = os.path.join(args.avatar_dir, MANIFEST_NAME)
+    if not os.path.exists(manifest_path):
+        print(f"Error: {manifest_path} not found. Run scripts/generate-smplx-avatars.py first.")
+        return 1
+    with open(manifest_path, 'r') as f:
+        manifest = json.load(f)
+
+    # gender -> ffmi key -> [(bf key, path)], body fat ascending
+    rows: Dict[str, Dict[str, List[Tuple[str, str]]]] = {}
+    for gender, ffmi_rows in manifest.get('avatars', {}).items():
+        for ffmi_key, frames in ffmi_rows.items():
+            rows.setdefault(gender, {})[ffmi_key] = sorted(
+                ((bf_key, os.path.join(args.avatar_dir, path)) for bf_key, path in frames.items()),
+                key=lambda item: body_fat_of(item[0]),
+            )
+    sources = [path for ffmi_rows in rows.values() for frames in ffmi_rows.values() for _, path in frames]
+    if not sources:
+        print("Error: the manifest does not list any avatars")
+        return 1
+
+    start = time.perf_counter()
+
+    # Pass 1: shared bounding box, one image in memory at a time
+    boxes = []
+    size = None
+    for path in sources:
+        image = load_rgba(path)
+        if size is None:
+            size = (image.shape[1], image.shape[0])
+        elif size != (image.shape[1], image.shape[0]):
+            print(f"Error: {path} is {image.shape[1]}x{image.shape[0]}, expected {size[0]}x{size[1]}")
+            return 1
+        box = content_bbox(image, args.tolerance)
+        if box is not None:
+            boxes.append(box)
+    crop = union_bbox(boxes, size, args.padding)
+    frame_w, frame_h = crop[2] - crop[0], crop[3] - crop[1]
+    print(f"Shared crop: {frame_w}x{frame_h} at ({crop[0]}, {crop[1]}) from {size[0]}x{size[1]}")
+
+    # Pass 2: one atlas per gender / FFMI row
+    source_hashes = {
+        path: entry.get('sha256')
+        for path, entry in ((os.path.join(args.avatar_dir, rel), entry)
+                            for rel, entry in manifest.get('entries', {}).items())
+    }
+    previous = manifest.get('atlases', {})
+    atlas_root = os.path.join(args.avatar_dir, args.atlas_dir)
+    os.makedirs(atlas_root, exist_ok=True)
+    atlases: Dict[str, Dict[str, Dict]] = {}
+    built = 0
+
+    for gender, ffmi_rows in rows.items():
+        for ffmi_key, frames in ffmi_rows.items():
+            digest = hashlib.sha256(json.dumps({
+                'crop': crop,
+                'colors': args.colors,
+                'version': PACKAGE_VERSION,
+            }).encode('utf-8'))
+            for _, path in frames:
+                digest.update((source_hashes.get(path) or file_sha256(path)).encode('utf-8'))
+            source_key = digest.hexdigest()
+
+            name = f"{gender}_{ffmi_key.replace('.', '_')}"
+            webp_rel = f"{args.atlas_dir}/{name}.webp"
+            png_rel = f"{args.atlas_dir}/{name}.png"
+            entry = previous.get(gender, {}).get(ffmi_key, {})
+            if (not args.force and entry.get('source_key') == source_key
+                    and os.path.exists(os.path.join(args.avatar_dir, webp_rel))
+                    and os.path.exists(os.path.join(args.avatar_dir, png_rel))):
+                atlases.setdefault(gender, {})[ffmi_key] = entry
+                continue
+
+            sheet = np.empty((frame_h, frame_w * len(frames), 4), dtype=np.uint8)
+            coordinates = {}
+            for i, (bf_key, path) in enumerate(frames):
+                sheet[:, i * frame_w:(i + 1) * frame_w] = load_rgba(path)[crop[1]:crop[3], crop[0]:crop[2]]
+                coordinates[bf_key] = {'x': i * frame_w, 'y': 0, 'w': frame_w, 'h': frame_h}
+
+            atlas = Image.fromarray(sheet, 'RGBA')
+            # Slowest, smallest lossless setting; this runs once per asset build
+            atlas.save(os.path.join(args.avatar_dir, webp_rel), 'WEBP', lossless=True, quality=100, method=6)
+            # No dithering keeps thin wireframe lines crisp and compresses better
+            atlas.quantize(colors=args.colors, method=Image.Quantize.FASTOCTREE, dither=Image.Dither.NONE).save(
+                os.path.join(args.avatar_dir, png_rel), 'PNG', optimize=True)
+            built += 1
+
+            atlases.setdefault(gender, {})[ffmi_key] = {
+                'webp': webp_rel,
+                'png': png_rel,
+                'width': frame_w * len(frames),
+                'height': frame_h,
+                'frames': coordinates,
+                'source_key': source_key,
+            }
+            print(f"  {name}: {len(frames)} frames")
+
+    manifest['atlases'] = atlases
+    manifest['atlas_crop'] = {'x': crop[0], 'y': crop[1], 'w': frame_w, 'h': frame_h,
+                              'source_width': size[0], 'source_height': size[1]}
+    with open(manifest_path, 'w') as f:
+        json.dump(manifest, f, indent=2)
+
+    atlas_entries = [entry for ffmi_rows in atlases.values() for entry in ffmi_rows.values()]
+    before = sum(os.path.getsize(p) for p in sources)
+    webp_bytes = sum(os.path.getsize(os.path.join(args.avatar_dir, e['webp'])) for e in atlas_entries)
+    png_bytes = sum(os.path.getsize(os.path.join(args.avatar_dir, e['png'])) for e in atlas_entries)
+
+    print(f"\n{'=' * 60}")
+    print("Summary:")
+    print(f"  Atlases: {len(atlas_entries)} ({built} built, {len(atlas_entries) - built} up to date)")
+    print(f"  Before: {len(sources)} requests, {format_bytes(before)} (individual PNGs)")
+    print(f"  After (WebP): {len(atlas_entries)} requests, {format_bytes(webp_bytes)} "
+          f"({webp_bytes / before:.1%} of before)")
+    print(f"  After (palette PNG): {len(atlas_entries)} requests, {format_bytes(png_bytes)} "
+          f"({png_bytes / before:.1%} of before)")
+    print(f"  Time: {time.perf_counter() - start:.2f}s")
+    print(f"\nAtlas coordinates written to {manifest_path}")
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
@@ -0,0 +1,39 @@
+"""
+Shared helpers for the progress-photo batch scripts
+
+Used by normalize-progress-photos.py and dedupe-progress-photos.py.
+"""
+
+import os
+from typing import Iterator, Tuple
+
+from PIL import Image, ImageOps
+
+EXTENSIONS = {'.jpg', '.jpeg', '.png', '.webp', '.tif', '.tiff'}
+
+
+def iter_photos(root: str) -> Iterator[str]:
+    """Yield photo paths under root without listing the whole tree up front"""
+    stack = [root]
+    while stack:
+        with os.scandir(stack.pop()) as entries:
+            for entry in sorted(entries, key=lambda e: e.name):
+                if entry.is_dir(follow_symlinks=False):
+                    stack.append(entry.path)
+                elif os.path.splitext(entry.name)[1].lower() in EXTENSIONS:
+                    yield entry.path
+
+
+def load_oriented(path: str, size: Tuple[int, int]) -> Image.Image:
+    """Decode a photo upright, at reduced scale where the codec allows it"""
+    with Image.open(path) as source:
+        # draft() only affects JPEG; the photo may be rotated afterwards, so
+        # cover the longer side in both directions
+        longest = max(size)
+        source.draft('RGB', (longest, longest))
+        image = ImageOps.exif_transpose(source)
+        if image.mode not in ('RGB', 'RGBA'):
+            has_alpha = 'A' in image.getbands() or 'transparency' in image.info
+            image = image.convert('RGBA' if has_alpha else 'RGB')
+        image.load()
+    return image
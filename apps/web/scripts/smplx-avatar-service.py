@@ -0,0 +1,444 @@
+#!/usr/bin/env python3
+"""
+On-demand SMPL-X avatar render service
+
+Renders avatars for arbitrary body compositions instead of the fixed 10 x 5
+brackets of public/avatars-smplx. Requested values are quantized to a
+configurable grid and served from a two-tier cache: an in-memory LRU and a
+size-bounded disk cache. Concurrent requests for the same avatar share one
+render, and the common bracket grid is pre-rendered at start-up.
+
+Endpoints:
+    GET /avatar?gender=male&bf=18.4&ffmi=21.2[&format=webp]
+    GET /metrics   cache hit rates and render latency (JSON)
+    GET /health
+
+Usage:
+    python scripts/smplx-avatar-service.py --port 8787 --workers 2
+"""
+
+import argparse
+import hashlib
+import json
+import multiprocessing as mp
+import os
+import sys
+import threading
+import time
+from collections import OrderedDict, deque
+from concurrent.futures import Future, ProcessPoolExecutor
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, Optional, Tuple
+from urllib.parse import parse_qs, urlparse
+
+import numpy as np
+
+sys.path.insert(0, os.path.dirname(os.path.abspath(__file__)))
+
+from smplx_avatar import (  # noqa: E402
+    BODY_FAT_VALUES,
+    DEFAULT_RESOLUTION,
+    DEFAULT_STYLE,
+    FFMI_VALUES,
+    GENDERS,
+    MODEL_DIR,
+    RENDER_VERSION,
+    ShapeMapper,
+    avatar_grid,
+    format_value,
+    init_composition_worker,
+    model_file,
+    model_id,
+    render_composition,
+)
+
+CONTENT_TYPES = {'png': 'image/png', 'webp': 'image/webp'}
+
+# (gender, body_fat, ffmi, format) after quantization
+AvatarKey = Tuple[str, float, float, str]
+
+
+def quantize(value: float, step: float, low: float, high: float) -> float:
+    """Snap a value to the grid anchored at low and clamp it to the calibrated range"""
+    snapped = min(max(low + round((value - low) / step) * step, low), high)
+    # Avoid 17.500000000000004 style keys
+    return round(snapped, 6)
+
+
+class MemoryLRU:
+    """Byte-bounded in-memory LRU cache"""
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes = max_bytes
+        self.bytes = 0
+        self.items: 'OrderedDict[AvatarKey, bytes]' = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, key: AvatarKey) -> Optional[bytes]:
+        with self.lock:
+            data = self.items.get(key)
+            if data is not None:
+                self.items.move_to_end(key)
+            return data
+
+    def put(self, key: AvatarKey, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        with self.lock:
+            if key in self.items:
+                self.bytes -= len(self.items.pop(key))
+            self.items[key] = data
+            self.bytes += len(data)
+            while self.bytes > self.max_bytes:
+                _, evicted = self.items.popitem(last=False)
+                self.bytes -= len(evicted)
+
+
+class DiskCache:
+    """Size-bounded directory cache, evicting the least recently used files
+
+    Files live in a subdirectory named after the render settings, so changing
+    the style, resolution, mapping or model never serves stale images.
+    """
+
+    def __init__(self, root: str, namespace: str, max_bytes: int):
+        self.dir = os.path.join(root, namespace)
+        self.max_bytes = max_bytes
+        self.lock = threading.Lock()
+        os.makedirs(self.dir, exist_ok=True)
+        # path -> size in least to most recently used order, rebuilt from
+        # file modification times on start-up
+        self.entries: 'OrderedDict[str, int]' = OrderedDict()
+        files = []
+        for name in os.listdir(self.dir):
+            path = os.path.join(self.dir, name)
+            if name.endswith('.tmp') or not os.path.isfile(path):
+                continue
+            stat = os.stat(path)
+            files.append((stat.st_mtime, path, stat.st_size))
+        for _, path, size in sorted(files):
+            self.entries[path] = size
+        self.bytes = sum(self.entries.values())
+
+    def _path(self, key: AvatarKey) -> str:
+        gender, body_fat, ffmi, fmt = key
+        return os.path.join(self.dir, f"{gender}_ffmi{format_value(ffmi)}_bf{format_value(body_fat)}.{fmt}")
+
+    def get(self, key: AvatarKey) -> Optional[bytes]:
+        path = self._path(key)
+        with self.lock:
+            if path not in self.entries:
+                return None
+            self.entries.move_to_end(path)
+        try:
+            with open(path, 'rb') as f:
+                data = f.read()
+            # Persist recency so eviction order survives restarts
+            os.utime(path)
+            return data
+        except OSError:
+            with self.lock:
+                self.bytes -= self.entries.pop(path, 0)
+            return None
+
+    def put(self, key: AvatarKey, data: bytes):
+        if len(data) > self.max_bytes:
+            return
+        path = self._path(key)
+        tmp = f"{path}.{os.getpid()}.{threading.get_ident()}.tmp"
+        with open(tmp, 'wb') as f:
+            f.write(data)
+        os.replace(tmp, path)
+
+        with self.lock:
+            self.bytes -= self.entries.pop(path, 0)
+            self.entries[path] = len(data)
+            self.bytes += len(data)
+            evicted = []
+            while self.bytes > self.max_bytes:
+                old_path, size = self.entries.popitem(last=False)
+                self.bytes -= size
+                evicted.append(old_path)
+        for old_path in evicted:
+            try:
+                os.remove(old_path)
+            except OSError:
+                pass
+
+
+class Metrics:
+    """Request counters and render latency samples"""
+
+    def __init__(self, window: int = 1000):
+        self.lock = threading.Lock()
+        self.counts = {'requests': 0, 'memory_hits': 0, 'disk_hits': 0, 'renders': 0,
+                       'coalesced': 0, 'errors': 0}
+        self.render_seconds = deque(maxlen=window)
+        self.request_seconds = deque(maxlen=window)
+
+    def count(self, name: str):
+        with self.lock:
+            self.counts[name] += 1
+
+    def observe(self, name: str, seconds: float):
+        with self.lock:
+            getattr(self, name).append(seconds)
+
+    @staticmethod
+    def _latency(samples) -> Dict[str, float]:
+        if not samples:
+            return {'count': 0}
+        values = np.fromiter(samples, dtype=np.float64) * 1000
+        return {
+            'count': int(values.size),
+            'mean_ms': round(float(values.mean()), 2),
+            'p50_ms': round(float(np.percentile(values, 50)), 2),
+            'p95_ms': round(float(np.percentile(values, 95)), 2),
+            'max_ms': round(float(values.max()), 2),
+        }
+
+    def snapshot(self) -> Dict:
+        with self.lock:
+            counts = dict(self.counts)
+            render_seconds = list(self.render_seconds)
+            request_seconds = list(self.request_seconds)
+        served = counts['memory_hits'] + counts['disk_hits'] + counts['renders'] + counts['coalesced']
+        return {
+            **counts,
+            'hit_rate': round((counts['memory_hits'] + counts['disk_hits']) / served, 4) if served else 0.0,
+            'memory_hit_rate': round(counts['memory_hits'] / served, 4) if served else 0.0,
+            'render_latency': self._latency(render_seconds),
+            'request_latency': self._latency(request_seconds),
+        }
+
+
+class AvatarService:
+    """Quantizes requests and resolves them through memory, disk and renderer"""
+
+    def __init__(self, args):
+        self.bf_step = args.bf_step
+        self.ffmi_step = args.ffmi_step
+        self.memory = MemoryLRU(args.memory_cache_mb * 1024 * 1024)
+
+        style = dict(DEFAULT_STYLE)
+        resolution = tuple(int(v) for v in args.resolution.lower().split('x'))
+        namespace = hashlib.sha256(json.dumps({
+            'style': style,
+            'resolution': list(resolution),
+            'mapping': ShapeMapper().fingerprint(),
+            'models': [model_id(g, args.model_dir) for g in GENDERS],
+            'render_version': RENDER_VERSION,
+        }, sort_keys=True, default=float).encode('utf-8')).hexdigest()[:16]
+        self.disk = DiskCache(args.cache_dir, namespace, args.disk_cache_mb * 1024 * 1024)
+
+        self.metrics = Metrics()
+        self.inflight: Dict[AvatarKey, Future] = {}
+        self.inflight_lock = threading.Lock()
+        # spawn: OpenGL contexts and torch threads do not survive fork reliably
+        self.pool = ProcessPoolExecutor(
+            max_workers=args.workers,
+            mp_context=mp.get_context('spawn'),
+            initializer=init_composition_worker,
+            initargs=(args.model_dir, style, resolution, args.platform),
+        )
+
+    def key(self, gender: str, body_fat: float, ffmi: float, fmt: str) -> AvatarKey:
+        return (
+            gender,
+            quantize(body_fat, self.bf_step, BODY_FAT_VALUES[0], BODY_FAT_VALUES[-1]),
+            quantize(ffmi, self.ffmi_step, FFMI_VALUES[0], FFMI_VALUES[-1]),
+            fmt,
+        )
+
+    def get(self, key: AvatarKey) -> Tuple[bytes, str]:
+        """Return (image bytes, source) where source is memory/disk/render/coalesced"""
+        data = self.memory.get(key)
+        if data is not None:
+            self.metrics.count('memory_hits')
+            return data, 'memory'
+
+        data = self.disk.get(key)
+        if data is not None:
+            self.metrics.count('disk_hits')
+            self.memory.put(key, data)
+            return data, 'disk'
+
+        # Single flight: only the first request for a key renders it
+        with self.inflight_lock:
+            future = self.inflight.get(key)
+            owner = future is None
+            if owner:
+                # A render may have finished since the cache lookups above;
+                # owners fill the memory cache before leaving inflight
+                data = self.memory.get(key)
+                if data is not None:
+                    self.metrics.count('memory_hits')
+                    return data, 'memory'
+                future = Future()
+                self.inflight[key] = future
+
+        if not owner:
+            self.metrics.count('coalesced')
+            return future.result(), 'coalesced'
+
+        try:
+            data, seconds = self.pool.submit(render_composition, key).result()
+            self.metrics.count('renders')
+            self.metrics.observe('render_seconds', seconds)
+            self.memory.put(key, data)
+            self.disk.put(key, data)
+            future.set_result(data)
+            return data, 'render'
+        except BaseException as e:
+            self.metrics.count('errors')
+            future.set_exception(e)
+            raise
+        finally:
+            with self.inflight_lock:
+                self.inflight.pop(key, None)
+
+    def prewarm(self, fmt: str, concurrency: int):
+        """Render the standard bracket grid into the caches"""
+        keys = [self.key(g, bf, f, fmt) for g, f, bf in avatar_grid()]
+        start = time.perf_counter()
+        semaphore = threading.Semaphore(concurrency)
+        threads = []
+
+        def warm(key):
+            try:
+                self.get(key)
+            except Exception as e:
+                print(f"Pre-warm failed for {key}: {e}")
+            finally:
+                semaphore.release()
+
+        for key in keys:
+            semaphore.acquire()
+            thread = threading.Thread(target=warm, args=(key,), daemon=True)
+            thread.start()
+            threads.append(thread)
+        for thread in threads:
+            thread.join()
+        print(f"Pre-warmed {len(keys)} avatars in {time.perf_counter() - start:.1f}s")
+
+    def close(self):
+        self.pool.shutdown(cancel_futures=True)
+
+
+class AvatarHandler(BaseHTTPRequestHandler):
+    service: AvatarService = None
+
+    def do_GET(self):
+        url = urlparse(self.path)
+        if url.path == '/health':
+            self._send_json(200, {'status': 'ok'})
+        elif url.path == '/metrics':
+            self._send_json(200, self.service.metrics.snapshot())
+        elif url.path == '/avatar':
+            self._serve_avatar(parse_qs(url.query))
+        else:
+            self._send_json(404, {'error': 'Not found'})
+
+    def _serve_avatar(self, query: Dict):
+        start = time.perf_counter()
+        self.service.metrics.count('requests')
+        try:
+            gender = query.get('gender', ['male'])[0]
+            fmt = query.get('format', ['png'])[0].lower()
+            body_fat = float(query.get('bf', ['20'])[0])
+            ffmi = float(query.get('ffmi', ['20'])[0])
+        except ValueError:
+            self._send_json(400, {'error': 'bf and ffmi must be numbers'})
+            return
+        if gender not in GENDERS or fmt not in CONTENT_TYPES or not np.isfinite([body_fat, ffmi]).all():
+            self._send_json(400, {'error': f"gender must be one of {GENDERS}, format one of {list(CONTENT_TYPES)}"})
+            return
+
+        key = self.service.key(gender, body_fat, ffmi, fmt)
+        try:
+            data, source = self.service.get(key)
+        except Exception as e:
+            self._send_json(500, {'error': f"Render failed: {e}"})
+            return
+
+        self.send_response(200)
+        self.send_header('Content-Type', CONTENT_TYPES[fmt])
+        self.send_header('Content-Length', str(len(data)))
+        self.send_header('Cache-Control', 'public, max-age=86400')
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.send_header('X-Avatar-Key', f"{key[0]}_bf{key[1]:g}_ffmi{key[2]:g}")
+        self.send_header('X-Cache', source)
+        self.end_headers()
+        self.wfile.write(data)
+        self.service.metrics.observe('request_seconds', time.perf_counter() - start)
+
+    def _send_json(self, status: int, payload: Dict):
+        body = json.dumps(payload, indent=2).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.send_header('Access-Control-Allow-Origin', '*')
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} - {format % args}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='On-demand SMPL-X avatar render service')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to bind')
+    parser.add_argument('--port', type=int, default=8787, help='Port to listen on')
+    parser.add_argument('--model-dir', default=MODEL_DIR, help=f'Directory with SMPLX_*.npz (default: {MODEL_DIR})')
+    parser.add_argument('--cache-dir', default='./.cache/avatars-smplx', help='Disk cache directory')
+    parser.add_argument('--bf-step', type=float, default=1.0, help='Body fat grid step in %% (default: 1.0)')
+    parser.add_argument('--ffmi-step', type=float, default=0.5, help='FFMI grid step (default: 0.5)')
+    parser.add_argument('--memory-cache-mb', type=int, default=64, help='In-memory cache size (default: 64)')
+    parser.add_argument('--disk-cache-mb', type=int, default=512, help='Disk cache size (default: 512)')
+    parser.add_argument('--resolution', default='x'.join(map(str, DEFAULT_RESOLUTION)),
+                        help='Image size as WIDTHxHEIGHT (default: 512x640)')
+    parser.add_argument('--workers', type=int, default=2, help='Render worker processes (default: 2)')
+    parser.add_argument('--platform', default='osmesa', choices=['osmesa', 'egl'],
+                        help='Headless OpenGL platform for pyrender (default: osmesa)')
+    parser.add_argument('--prewarm-format', default='png', choices=list(CONTENT_TYPES),
+                        help='Format of the pre-warmed bracket grid (default: png)')
+    parser.add_argument('--no-prewarm', action='store_true', help='Skip rendering the bracket grid at start-up')
+    args = parser.parse_args()
+
+    if args.bf_step <= 0 or args.ffmi_step <= 0:
+        print("Error: --bf-step and --ffmi-step must be greater than 0")
+        return 1
+
+    missing = [model_file(g, args.model_dir) for g in GENDERS if not os.path.exists(model_file(g, args.model_dir))]
+    if missing:
+        print("Error: SMPL-X models not found:")
+        for path in missing:
+            print(f"  {path}")
+        print("Download them from https://smpl-x.is.tue.mpg.de/ (see SMPLX_AVATAR_GUIDE.md)")
+        return 1
+
+    service = AvatarService(args)
+    AvatarHandler.service = service
+    server = ThreadingHTTPServer((args.host, args.port), AvatarHandler)
+    server.daemon_threads = True
+    print(f"SMPL-X avatar service listening on http://{args.host}:{args.port} "
+          f"(bf step {args.bf_step:g}, ffmi step {args.ffmi_step:g})")
+
+    if not args.no_prewarm:
+        threading.Thread(target=service.prewarm, args=(args.prewarm_format, args.workers * 2),
+                         daemon=True).start()
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        service.close()
+        print(json.dumps(service.metrics.snapshot(), indent=2))
+
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
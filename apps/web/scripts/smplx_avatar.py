@@ -0,0 +1,336 @@
+"""
+Shared SMPL-X avatar pipeline
+
+Maps body composition (BF%, FFMI) to SMPL-X shape parameters, evaluates the
+body model for many shapes in one batched forward pass and renders wireframe
+avatars with a reusable headless pyrender renderer. Used by
+generate-smplx-avatars.py and the other SMPL-X avatar scripts.
+
+Heavy dependencies (torch, smplx, pyrender, trimesh) are imported lazily so
+the mapping and manifest helpers work with only NumPy installed.
+"""
+
+import hashlib
+import json
+import os
+import time
+from typing import Dict, Iterable, List, Optional, Sequence, Tuple
+
+import numpy as np
+
+GENDERS = ['male', 'female']
+FFMI_VALUES = [15, 17.5, 20, 22.5, 25]
+BODY_FAT_VALUES = [5, 10, 15, 20, 25, 30, 35, 40, 45, 50]
+
+NUM_BETAS = 10
+MODEL_DIR = './assets/models/smplx'
+OUTPUT_DIR = './public/avatars-smplx'
+MANIFEST_NAME = 'avatar-manifest.json'
+
+# Bump when the renderer changes in a way the style dict does not capture
+RENDER_VERSION = 1
+
+DEFAULT_STYLE = {
+    'wireframe_color': [0.7, 0.5, 0.9, 1.0],
+    'background_color': [20, 20, 30, 255],
+    'camera_yfov': np.pi / 5,
+    'camera_distance': 3.0,
+    'camera_height': 0.9,
+    # A-pose: arms rotated 45 degrees down from the T-pose
+    'shoulder_angle': np.pi / 4,
+}
+DEFAULT_RESOLUTION = (512, 640)
+
+
+def format_value(value: float) -> str:
+    """Format a bracket value for file names (17.5 -> '17_5', 20.0 -> '20')"""
+    return f"{value:g}".replace('.', '_')
+
+
+def avatar_relpath(gender: str, ffmi: float, body_fat: float, ext: str = 'png') -> str:
+    """Path of an avatar relative to the output directory
+
+    Matches the layout used by getAvatarUrl in src/utils/avatar-utils-smplx.ts,
+    e.g. male/ffmi17_5/male_ffmi17_5_bf15.png
+    """
+    ffmi_str = format_value(ffmi)
+    return f"{gender}/ffmi{ffmi_str}/{gender}_ffmi{ffmi_str}_bf{format_value(body_fat)}.{ext}"
+
+
+def avatar_grid(genders: Sequence[str] = GENDERS,
+                ffmi_values: Sequence[float] = FFMI_VALUES,
+                body_fat_values: Sequence[float] = BODY_FAT_VALUES) -> List[Tuple[str, float, float]]:
+    """All (gender, ffmi, body_fat) combinations in a stable order"""
+    return [(g, f, bf) for g in genders for f in ffmi_values for bf in body_fat_values]
+
+
+def file_sha256(path: str, chunk_size: int = 1 << 20) -> str:
+    """Content hash of a file"""
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for chunk in iter(lambda: f.read(chunk_size), b''):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def format_bytes(n: int) -> str:
+    if n < 1024:
+        return f"{n} B"
+    if n < 1024 * 1024:
+        return f"{n / 1024:.1f} KB"
+    return f"{n / (1024 * 1024):.2f} MB"
+
+
+def render_key(gender: str, betas: np.ndarray, style: Dict, resolution: Tuple[int, int],
+               model_id: str) -> str:
+    """Hash of everything that determines how an avatar looks
+
+    Two avatars with the same key render to the same image, so a stored key
+    that still matches means the image does not need to be rendered again.
+    """
+    digest = hashlib.sha256()
+    digest.update(json.dumps({
+        'gender': gender,
+        'style': style,
+        'resolution': list(resolution),
+        'model': model_id,
+        'render_version': RENDER_VERSION,
+    }, sort_keys=True, default=float).encode('utf-8'))
+    # Round so float noise from the regression does not invalidate the cache
+    digest.update(np.round(np.asarray(betas, dtype=np.float64), 6).tobytes())
+    return digest.hexdigest()
+
+
+class ShapeMapper:
+    """Linear map from (BF%, FFMI) to the first SMPL-X shape parameters"""
+
+    def __init__(self, samples: Optional[List[Tuple[float, float, List[float]]]] = None):
+        self.samples = samples if samples is not None else self._initialize_shape_mapper()
+        features = self._features(
+            np.array([s[0] for s in self.samples], dtype=np.float64),
+            np.array([s[1] for s in self.samples], dtype=np.float64),
+        )
+        targets = np.array([s[2] for s in self.samples], dtype=np.float64)
+        # Least-squares fit of betas = [1, bf, ffmi, bf*ffmi] @ weights
+        self.weights, *_ = np.linalg.lstsq(features, targets, rcond=None)
+
+    @staticmethod
+    def _initialize_shape_mapper() -> List[Tuple[float, float, List[float]]]:
+        """Calibration points for the regression
+
+        Betas: [size, muscle, fat, proportions...]
+        """
+        return [
+            # (BF%, FFMI) -> [size, muscle, fat, ...]
+            (5, 15, [-1.0, -1.5, -2.0, 0.2, 0.0, 0, 0, 0, 0, 0]),
+            (5, 25, [0.5, 2.5, -2.5, 0.3, -0.1, 0, 0, 0, 0, 0]),
+            (15, 20, [-0.2, 0.8, -0.8, 0.1, 0.0, 0, 0, 0, 0, 0]),
+            (20, 20, [0.0, 0.0, 0.0, 0.0, 0.0, 0, 0, 0, 0, 0]),
+            (30, 17.5, [0.5, -0.5, 1.2, -0.1, 0.1, 0, 0, 0, 0, 0]),
+            (50, 15, [1.5, -1.5, 3.0, -0.3, 0.3, 0, 0, 0, 0, 0]),
+            (50, 25, [2.5, 1.5, 2.5, -0.2, 0.2, 0, 0, 0, 0, 0]),
+        ]
+
+    @staticmethod
+    def _features(body_fat: np.ndarray, ffmi: np.ndarray) -> np.ndarray:
+        return np.stack([np.ones_like(body_fat), body_fat, ffmi, body_fat * ffmi], axis=1)
+
+    def betas(self, body_fat: Iterable[float], ffmi: Iterable[float]) -> np.ndarray:
+        """Shape parameters for many compositions at once, shape (N, NUM_BETAS)"""
+        body_fat = np.atleast_1d(np.asarray(body_fat, dtype=np.float64))
+        ffmi = np.atleast_1d(np.asarray(ffmi, dtype=np.float64))
+        betas = self._features(body_fat, ffmi) @ self.weights
+        # Stay inside the range the body model was trained on
+        return np.clip(betas, -5.0, 5.0).astype(np.float32)
+
+    def fingerprint(self) -> str:
+        """Hash of the calibration data, changes whenever the mapping does"""
+        return hashlib.sha256(json.dumps(self.samples, default=float).encode('utf-8')).hexdigest()
+
+
+def model_file(gender: str, model_dir: str = MODEL_DIR) -> str:
+    return os.path.join(model_dir, f"SMPLX_{gender.upper()}.npz")
+
+
+def model_id(gender: str, model_dir: str = MODEL_DIR) -> str:
+    """Cheap identity of a model file (name and size) for render keys"""
+    path = model_file(gender, model_dir)
+    return f"{os.path.basename(path)}:{os.path.getsize(path)}"
+
+
+def a_pose(batch_size: int, shoulder_angle: float):
+    """Body pose tensor with the arms lowered from the T-pose"""
+    import torch
+
+    body_pose = torch.zeros((batch_size, 63), dtype=torch.float32)
+    # Joints 16/17 (left/right shoulder) are entries 15/16 of body_pose,
+    # which excludes the pelvis; rotate around z
+    body_pose[:, 15 * 3 + 2] = -shoulder_angle
+    body_pose[:, 16 * 3 + 2] = shoulder_angle
+    return body_pose
+
+
+def load_body_model(gender: str, model_dir: str = MODEL_DIR, batch_size: int = 1):
+    """Load the SMPL-X model of a gender for a fixed batch size"""
+    import smplx
+
+    return smplx.create(
+        model_file(gender, model_dir),
+        model_type='smplx',
+        gender=gender,
+        num_betas=NUM_BETAS,
+        batch_size=batch_size,
+        use_pca=False,
+    )
+
+
+def evaluate_shapes(gender: str, betas: np.ndarray, model_dir: str = MODEL_DIR,
+                    shoulder_angle: float = DEFAULT_STYLE['shoulder_angle'],
+                    model=None) -> Tuple[np.ndarray, np.ndarray]:
+    """Run the SMPL-X model once for a whole batch of shapes on CPU
+
+    Returns (vertices of shape (N, V, 3), faces of shape (F, 3)). Pass a model
+    loaded with load_body_model to avoid reloading it for every batch; its
+    batch size must match len(betas).
+    """
+    import torch
+
+    batch_size = len(betas)
+    if model is None:
+        model = load_body_model(gender, model_dir, batch_size)
+    with torch.no_grad():
+        output = model(
+            betas=torch.as_tensor(betas, dtype=torch.float32),
+            body_pose=a_pose(batch_size, shoulder_angle),
+            return_verts=True,
+        )
+    vertices = output.vertices.cpu().numpy().astype(np.float32)
+    faces = np.asarray(model.faces, dtype=np.int32)
+    return vertices, faces
+
+
+def ground_vertices(vertices: np.ndarray) -> np.ndarray:
+    """Stand a mesh on y=0 and center it on x/z, keeping its real height"""
+    vertices = vertices.copy()
+    vertices[:, 1] -= vertices[:, 1].min()
+    vertices[:, [0, 2]] -= (vertices[:, [0, 2]].min(axis=0) + vertices[:, [0, 2]].max(axis=0)) / 2
+    return vertices
+
+
+class WireframeRenderer:
+    """Headless renderer that keeps one OpenGL context and scene alive
+
+    Creating an OffscreenRenderer sets up a GL context, which costs more than
+    rendering a mesh, so each worker process builds one and only swaps the
+    mesh node between avatars.
+    """
+
+    def __init__(self, faces: np.ndarray, style: Dict = DEFAULT_STYLE,
+                 resolution: Tuple[int, int] = DEFAULT_RESOLUTION, platform: str = 'osmesa'):
+        # Must be set before pyrender (and PyOpenGL) is imported
+        os.environ.setdefault('PYOPENGL_PLATFORM', platform)
+        import pyrender
+
+        self.pyrender = pyrender
+        self.faces = faces
+        self.style = style
+        width, height = resolution
+
+        bg = np.asarray(style['background_color'], dtype=np.float32) / 255.0
+        self.scene = pyrender.Scene(bg_color=bg, ambient_light=[0.4, 0.4, 0.4])
+
+        camera = pyrender.PerspectiveCamera(yfov=style['camera_yfov'], aspectRatio=width / height)
+        camera_pose = np.eye(4)
+        camera_pose[1, 3] = style['camera_height']
+        camera_pose[2, 3] = style['camera_distance']
+        self.scene.add(camera, pose=camera_pose)
+        self.scene.add(pyrender.DirectionalLight(color=np.ones(3), intensity=2.0), pose=camera_pose)
+
+        self.material = pyrender.MetallicRoughnessMaterial(
+            baseColorFactor=style['wireframe_color'],
+            metallicFactor=0.0,
+            roughnessFactor=1.0,
+        )
+        self.renderer = pyrender.OffscreenRenderer(width, height)
+        self.mesh_node = None
+
+    def render_wireframe(self, vertices: np.ndarray) -> np.ndarray:
+        """Render one body as an RGBA uint8 image"""
+        import trimesh
+
+        mesh = trimesh.Trimesh(ground_vertices(vertices), self.faces, process=False)
+        if self.mesh_node is not None:
+            self.scene.remove_node(self.mesh_node)
+        self.mesh_node = self.scene.add(
+            self.pyrender.Mesh.from_trimesh(mesh, material=self.material, wireframe=True)
+        )
+        color, _ = self.renderer.render(self.scene, flags=self.pyrender.RenderFlags.RGBA)
+        return color
+
+    def close(self):
+        self.renderer.delete()
+
+
+# Per-process renderer for multiprocessing pools. Workers are started with
+# init_render_worker and then handle render_job calls.
+_worker_renderer: Optional[WireframeRenderer] = None
+
+
+def init_render_worker(faces: np.ndarray, style: Dict, resolution: Tuple[int, int], platform: str):
+    global _worker_renderer
+    _worker_renderer = WireframeRenderer(faces, style, resolution, platform)
+
+
+def encode_image(image: np.ndarray, fmt: str) -> bytes:
+    """Encode an RGBA image as PNG or lossless WebP"""
+    import io
+    from PIL import Image
+
+    buffer = io.BytesIO()
+    if fmt == 'webp':
+        Image.fromarray(image, 'RGBA').save(buffer, 'WEBP', lossless=True, method=4)
+    else:
+        Image.fromarray(image, 'RGBA').save(buffer, 'PNG', optimize=True)
+    return buffer.getvalue()
+
+
+def render_job(job: Tuple[str, np.ndarray]) -> Tuple[str, float]:
+    """Render vertices to a PNG file; returns (path, seconds)"""
+    from PIL import Image
+
+    path, vertices = job
+    start = time.perf_counter()
+    image = _worker_renderer.render_wireframe(vertices)
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    Image.fromarray(image, 'RGBA').save(path, optimize=True)
+    return path, time.perf_counter() - start
+
+
+# Per-process state for rendering arbitrary compositions on demand. Workers
+# are started with init_composition_worker and keep one body model per gender
+# plus one renderer for their whole lifetime.
+_worker_models: Dict[str, object] = {}
+_worker_mapper: Optional[ShapeMapper] = None
+_worker_model_dir = MODEL_DIR
+
+
+def init_composition_worker(model_dir: str, style: Dict, resolution: Tuple[int, int], platform: str):
+    global _worker_mapper, _worker_model_dir
+    _worker_model_dir = model_dir
+    _worker_mapper = ShapeMapper()
+    # SMPL-X uses the same topology for every gender
+    _worker_models[GENDERS[0]] = load_body_model(GENDERS[0], model_dir)
+    init_render_worker(np.asarray(_worker_models[GENDERS[0]].faces, dtype=np.int32), style, resolution, platform)
+
+
+def render_composition(job: Tuple[str, float, float, str]) -> Tuple[bytes, float]:
+    """Render (gender, body_fat, ffmi, fmt) to encoded image bytes; returns (bytes, seconds)"""
+    gender, body_fat, ffmi, fmt = job
+    start = time.perf_counter()
+    if gender not in _worker_models:
+        _worker_models[gender] = load_body_model(gender, _worker_model_dir)
+    betas = _worker_mapper.betas([body_fat], [ffmi])
+    vertices, _ = evaluate_shapes(gender, betas, shoulder_angle=_worker_renderer.style['shoulder_angle'],
+                                  model=_worker_models[gender])
+    data = encode_image(_worker_renderer.render_wireframe(vertices[0]), fmt)
+    return data, time.perf_counter() - start
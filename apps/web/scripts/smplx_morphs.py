@@ -0,0 +1,174 @@
+"""
+Compact morph-target format for SMPL-X avatars
+
+An avatar mesh for any body composition is a base mesh plus weighted vertex
+deltas. With u = normalized body fat and w = normalized FFMI (both 0..1 over
+the calibrated range):
+
+    vertices = base + u * bf + w * ffmi + u * w * bf_ffmi
+
+This is exact for the bilinear ShapeMapper, because SMPL-X vertices in a fixed
+pose are affine in the shape parameters.
+
+File layout (little endian):
+
+    magic    b'LYBM'
+    version  uint32
+    length   uint32   byte length of the JSON header
+    header   JSON     buffer offsets, dtypes, scales and per-vertex error bounds
+    padding  to a 4 byte boundary
+    buffers  uint16 index buffer shared by all genders, then per gender the
+             base mesh and one delta buffer per basis (int16 or float16)
+
+Buffer offsets in the header are relative to the start of the buffer section.
+decode() and blend() below are the NumPy reference decoder.
+"""
+
+import json
+import struct
+from typing import Dict, Optional
+
+import numpy as np
+
+MAGIC = b'LYBM'
+VERSION = 1
+BASES = ['bf', 'ffmi', 'bf_ffmi']
+INT16_MAX = 32767
+
+
+def _align(n: int, alignment: int = 4) -> int:
+    return (n + alignment - 1) // alignment * alignment
+
+
+def quantize(values: np.ndarray, dtype: str, center: bool = False) -> Dict:
+    """Quantize an (N, 3) float array
+
+    int16 uses a per-axis scale (and origin when center=True, for absolute
+    positions); float16 stores the values directly. Returns the encoded array,
+    its decode parameters and the largest per-vertex (Euclidean) error.
+    """
+    values = np.asarray(values, dtype=np.float64)
+    if dtype == 'float16':
+        encoded = values.astype(np.float16)
+        origin = np.zeros(3)
+        scale = np.ones(3)
+        decoded = encoded.astype(np.float64)
+    elif dtype == 'int16':
+        if center:
+            origin = (values.min(axis=0) + values.max(axis=0)) / 2
+        else:
+            origin = np.zeros(3)
+        extent = np.abs(values - origin).max(axis=0)
+        scale = np.where(extent > 0, extent / INT16_MAX, 1.0)
+        encoded = np.round((values - origin) / scale).astype(np.int16)
+        decoded = encoded.astype(np.float64) * scale + origin
+    else:
+        raise ValueError(f"Unsupported dtype: {dtype}")
+
+    error = np.linalg.norm(decoded - values, axis=1).max() if values.size else 0.0
+    return {
+        'data': encoded,
+        'dtype': dtype,
+        'origin': origin.tolist(),
+        'scale': scale.tolist(),
+        'error_bound': float(error),
+    }
+
+
+def encode(meshes: Dict[str, Dict[str, np.ndarray]], faces: np.ndarray, ranges: Dict[str, list],
+           dtype: str = 'int16', metadata: Optional[Dict] = None) -> bytes:
+    """Serialize morph bases
+
+    meshes maps gender -> {'base': (V, 3), 'bf': (V, 3), 'ffmi': (V, 3),
+    'bf_ffmi': (V, 3)} in float meters. ranges maps 'bf'/'ffmi' to the
+    [low, high] values that u/w = 0/1 correspond to.
+    """
+    faces = np.asarray(faces)
+    vertex_count = next(iter(meshes.values()))['base'].shape[0]
+    if vertex_count > np.iinfo(np.uint16).max + 1:
+        raise ValueError(f"{vertex_count} vertices do not fit a uint16 index buffer")
+
+    buffers = []
+    offset = 0
+
+    def add(data: np.ndarray) -> int:
+        nonlocal offset
+        start = offset
+        raw = np.ascontiguousarray(data).astype(data.dtype.newbyteorder('<')).tobytes()
+        buffers.append(raw + b'\0' * (_align(len(raw)) - len(raw)))
+        offset += _align(len(raw))
+        return start
+
+    indices = faces.astype(np.uint16).reshape(-1)
+    header = {
+        'vertex_count': int(vertex_count),
+        'index_count': int(indices.size),
+        'index_offset': add(indices),
+        'ranges': ranges,
+        'genders': {},
+        **(metadata or {}),
+    }
+
+    for gender, mesh in meshes.items():
+        entries = {}
+        for name in ['base'] + BASES:
+            q = quantize(mesh[name], dtype, center=(name == 'base'))
+            entries[name] = {
+                'offset': add(q['data']),
+                'dtype': q['dtype'],
+                'origin': q['origin'],
+                'scale': q['scale'],
+                'error_bound': q['error_bound'],
+            }
+        # u, w in [0, 1], so by the triangle inequality no blended vertex is
+        # further off than the sum of the basis errors
+        header['genders'][gender] = {
+            'bases': entries,
+            'error_bound': sum(e['error_bound'] for e in entries.values()),
+        }
+
+    header_bytes = json.dumps(header, separators=(',', ':')).encode('utf-8')
+    prefix = MAGIC + struct.pack('<II', VERSION, len(header_bytes)) + header_bytes
+    prefix += b'\0' * (_align(len(prefix)) - len(prefix))
+    return prefix + b''.join(buffers)
+
+
+def decode(data: bytes) -> Dict:
+    """Parse a morph file into float32 NumPy arrays"""
+    if data[:4] != MAGIC:
+        raise ValueError("Not an avatar morph file")
+    version, header_length = struct.unpack_from('<II', data, 4)
+    if version != VERSION:
+        raise ValueError(f"Unsupported morph file version {version}")
+    header = json.loads(data[12:12 + header_length].decode('utf-8'))
+    body = memoryview(data)[_align(12 + header_length):]
+
+    vertex_count = header['vertex_count']
+    indices = np.frombuffer(body, dtype='<u2', count=header['index_count'], offset=header['index_offset'])
+
+    genders = {}
+    for gender, info in header['genders'].items():
+        mesh = {}
+        for name, entry in info['bases'].items():
+            dtype = '<i2' if entry['dtype'] == 'int16' else '<f2'
+            raw = np.frombuffer(body, dtype=dtype, count=vertex_count * 3, offset=entry['offset'])
+            values = raw.reshape(vertex_count, 3).astype(np.float32)
+            if entry['dtype'] == 'int16':
+                values = values * np.float32(entry['scale']) + np.float32(entry['origin'])
+            mesh[name] = values
+        genders[gender] = mesh
+
+    return {
+        'header': header,
+        'faces': indices.reshape(-1, 3).astype(np.int32),
+        'genders': genders,
+    }
+
+
+def blend(morphs: Dict, gender: str, body_fat: float, ffmi: float) -> np.ndarray:
+    """Vertices for any composition, clamped to the calibrated range"""
+    ranges = morphs['header']['ranges']
+    u = np.clip((body_fat - ranges['bf'][0]) / (ranges['bf'][1] - ranges['bf'][0]), 0.0, 1.0)
+    w = np.clip((ffmi - ranges['ffmi'][0]) / (ranges['ffmi'][1] - ranges['ffmi'][0]), 0.0, 1.0)
+    mesh = morphs['genders'][gender]
+    return mesh['base'] + u * mesh['bf'] + w * mesh['ffmi'] + (u * w) * mesh['bf_ffmi']
@@ -4,7 +4,11 @@ export const AVATAR_CONFIG = {
   SMPLX_BASE_PATH: '/avatars-smplx',
   EXISTING_BASE_PATH: '/avatars',
   DEMO_BASE_PATH: '/avatars-wireframe-demo',
-  USE_DEMO: false // Set to true to use demo wireframes
+  USE_DEMO: false, // Set to true to use demo wireframes
+  // On-demand render service (scripts/smplx-avatar-service.py). When set, SMPL-X
+  // avatars follow body fat and FFMI at the service's grid resolution instead
+  // of the pre-rendered brackets.
+  RENDER_SERVICE_URL: process.env.NEXT_PUBLIC_AVATAR_SERVICE_URL || ''
 }
 
 // Get closest FFMI bracket for SMPL-X avatars
@@ -45,6 +49,16 @@ export function getAvatarUrl(
   const normalizedBodyFat = bodyFatPercentage ?? defaultBodyFat
   const normalizedFFMI = ffmi ?? defaultFFMI
 
+  // The render service quantizes values itself; one decimal keeps URLs stable
+  if (AVATAR_CONFIG.RENDER_SERVICE_URL && ffmi !== undefined) {
+    const params = new URLSearchParams({
+      gender: normalizedGender,
+      bf: normalizedBodyFat.toFixed(1),
+      ffmi: normalizedFFMI.toFixed(1)
+    })
+    return `${AVATAR_CONFIG.RENDER_SERVICE_URL}/avatar?${params.toString()}`
+  }
+
   // If SMPL-X avatars are available and FFMI is provided
   if (AVATAR_CONFIG.USE_SMPLX && ffmi !== undefined) {
     const bfBracket = getBodyFatBracket(normalizedBodyFat)
@@ -17,6 +17,10 @@ from typing import Dict, List, Tuple, Optional
 from github import Github
 import anthropic
 
+from prompt_cache import CacheUsage, cached_system, prefix_note
+
+MODEL = "claude-3-haiku-20240307"
+
 class IssueTriager:
     def __init__(self, github_token: str, anthropic_api_key: str, config_path: Optional[str] = None):
         self.github = Github(github_token)
@@ -39,6 +43,14 @@ class IssueTriager:
                 'complexity_threshold': 500
             }
             self.rules = []
+        
+        # The tool criteria, scoring rules and response schema only depend on
+        # the config, so they form a stable prompt prefix. Even with the full
+        # config it stays well below Haiku's 2048-token caching minimum, and a
+        # run triages a single issue, so it is not cached in practice; the
+        # breakpoint only pays off if the config grows.
+        self.analysis_instructions = self._build_analysis_instructions()
+        self.usage = CacheUsage()
     
     def _parse_config(self, config: Dict) -> Dict:
         """Parse the YAML configuration into tool criteria"""
@@ -96,6 +108,45 @@ class IssueTriager:
             }
         }
     
+    def _build_analysis_instructions(self) -> str:
+        """Build the static part of the analysis prompt from the tool criteria"""
+        tools = []
+        for i, (tool, criteria) in enumerate(self.tool_criteria.items(), 1):
+            entry = f"{i}. {tool.capitalize()}: {criteria['description']}"
+            if criteria['keywords']:
+                entry += f"\n   Keywords: {', '.join(criteria['keywords'])}"
+            if criteria['patterns']:
+                entry += f"\n   Patterns: {', '.join(criteria['patterns'])}"
+            for example in criteria.get('examples', []):
+                entry += f"\n   Example: {example}"
+            tools.append(entry)
+        
+        scoring = [f"- {name}: {value}" for name, value in self.scoring_config.items()]
+        rules = [
+            f"- {rule['condition']}: {rule['action']} {rule.get('points', 1)} to {rule.get('tool', '')}"
+            for rule in self.rules
+        ]
+        
+        return f"""Analyze GitHub issues and determine which AI tool would be most appropriate.
+
+Available tools:
+{chr(10).join(tools)}
+
+Each issue comes with scores from a keyword and pattern analysis. Use them as a
+hint, not as the final answer. Scoring weights:
+{chr(10).join(scoring)}
+
+Additional rules applied to the scores:
+{chr(10).join(rules) or '- none'}
+
+Provide a brief analysis and recommendation. Format your response as JSON:
+{{
+    "recommended_tool": "{'|'.join(self.tool_criteria.keys())}",
+    "confidence": "high|medium|low",
+    "reasoning": "brief explanation",
+    "alternative_tool": "optional second choice"
+}}"""
+    
     def analyze_issue(self, issue_title: str, issue_body: str) -> Dict:
         """Analyze issue content and determine the best AI tool"""
         combined_text = f"{issue_title} {issue_body}".lower()
@@ -133,33 +184,19 @@ class IssueTriager:
                 scores['claude'] += 1
         
         # Use Claude to provide a more nuanced analysis
-        prompt = f"""Analyze this GitHub issue and determine which AI tool would be most appropriate:
-
-Issue Title: {issue_title}
+        score_lines = '\n'.join(f"- {tool.capitalize()}: {score}" for tool, score in scores.items())
+        prompt = f"""Issue Title: {issue_title}
 Issue Body: {issue_body}
 
-Available tools:
-1. Sweep: {self.tool_criteria['sweep']['description']}
-2. Copilot: {self.tool_criteria['copilot']['description']}
-3. Claude: {self.tool_criteria['claude']['description']}
-
 Current scores based on keyword analysis:
-- Sweep: {scores['sweep']}
-- Copilot: {scores['copilot']}
-- Claude: {scores['claude']}
-
-Provide a brief analysis and recommendation. Format your response as JSON:
-{{
-    "recommended_tool": "sweep|copilot|claude",
-    "confidence": "high|medium|low",
-    "reasoning": "brief explanation",
-    "alternative_tool": "optional second choice"
-}}"""
+{score_lines}"""
 
         try:
-            response = self.anthropic.messages.create(
-                model="claude-3-haiku-20240307",
+            response = self.usage.create(
+                self.anthropic,
+                model=MODEL,
                 max_tokens=500,
+                system=cached_system(self.analysis_instructions),
                 messages=[{"role": "user", "content": prompt}]
             )
             
@@ -289,7 +326,8 @@ Example: `@sweep refactor the authentication module to use async/await`"""
             'labels': labels,
             'issue_number': issue_number,
             'issue_title': issue.title,
-            'issue_body': issue.body or ""
+            'issue_body': issue.body or "",
+            'usage': self.usage.to_dict()
         }
 
 
@@ -315,6 +353,9 @@ def main():
     
     # Create triager and process issue
     triager = IssueTriager(github_token, anthropic_api_key, config_path)
+    note = prefix_note(MODEL, triager.analysis_instructions)
+    if note:
+        print(note)
     result = triager.triage_issue(args.repo, args.issue_number)
     
     # Write result to file for the workflow to read
@@ -322,6 +363,7 @@ def main():
         json.dump(result, f, indent=2)
     
     print(f"Issue triaged to: {result['recommended_tool']}")
+    print(triager.usage.report())
     return 0
 
 
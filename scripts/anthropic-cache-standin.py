@@ -0,0 +1,229 @@
+#!/usr/bin/env python3
+"""
+Local Anthropic API stand-in for measuring prompt caching
+
+Serves POST /v1/messages with a canned JSON answer and models prompt caching
+the way the Messages API bills it: the prompt is flattened in order
+(tools, system, messages), every block carrying `cache_control` is a
+breakpoint, and a breakpoint prefix seen within the TTL is reported as
+`cache_read_input_tokens` instead of `input_tokens`. Response latency grows
+with the number of tokens that had to be processed, so cache hits are also
+visible in wall time.
+
+Point the scripts at it with ANTHROPIC_BASE_URL:
+
+    python scripts/anthropic-cache-standin.py --port 8765 &
+    ANTHROPIC_BASE_URL=http://127.0.0.1:8765 ANTHROPIC_API_KEY=local \\
+        python scripts/fix-codeql-issues.py --sarif results.sarif --dry-run
+
+Run it again with --no-cache to get the uncached baseline for comparison.
+"""
+
+import argparse
+import hashlib
+import json
+import sys
+import threading
+import time
+import uuid
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, List, Optional, Tuple
+
+from prompt_cache import estimate_tokens, min_cacheable_tokens
+
+# One answer that satisfies the JSON schema of every script in this directory
+CANNED_ANSWER = {
+    # ai-issue-triage.py
+    'recommended_tool': 'claude',
+    'confidence': 'medium',
+    'reasoning': 'Local stand-in response',
+    'alternative_tool': 'sweep',
+    # claude-auto-fix.py
+    'analysis': 'Local stand-in response',
+    'fix_type': 'bug',
+    'complexity': 'low',
+    'files_to_modify': [],
+    'implementation_steps': [],
+    'testing_required': False,
+    'test_plan': 'N/A',
+    # fix-codeql-issues.py
+    'vulnerability': 'Local stand-in response',
+    'impact': 'N/A',
+    'fix_explanation': 'N/A',
+    'old_code': '',
+    'new_code': '',
+}
+
+
+def flatten_prompt(request: Dict[str, Any]) -> List[Tuple[str, bool]]:
+    """Flatten a Messages API request into (text, is_breakpoint) segments"""
+    segments = []
+
+    for tool in request.get('tools', []):
+        segments.append((json.dumps(tool, sort_keys=True), 'cache_control' in tool))
+
+    system = request.get('system')
+    if isinstance(system, str):
+        segments.append((system, False))
+    elif isinstance(system, list):
+        for block in system:
+            segments.append((block.get('text', ''), 'cache_control' in block))
+
+    for message in request.get('messages', []):
+        content = message.get('content')
+        if isinstance(content, str):
+            segments.append((f"{message.get('role')}:{content}", False))
+            continue
+        for block in content or []:
+            text = block.get('text') if block.get('type') == 'text' else json.dumps(block, sort_keys=True)
+            segments.append((f"{message.get('role')}:{text}", 'cache_control' in block))
+
+    return segments
+
+
+class PromptCache:
+    """Prefix cache keyed by the hash of everything up to a breakpoint"""
+
+    def __init__(self, ttl: float, min_tokens: Optional[int] = None, enabled: bool = True):
+        # None applies the API minimum of the requested model
+        self.ttl = ttl
+        self.min_tokens = min_tokens
+        self.enabled = enabled
+        self.entries: Dict[str, float] = {}
+        self.lock = threading.Lock()
+        self.totals = {
+            'requests': 0,
+            'input_tokens': 0,
+            'cache_read_input_tokens': 0,
+            'cache_creation_input_tokens': 0,
+        }
+
+    def usage_for(self, segments: List[Tuple[str, bool]], model: str = '') -> Dict[str, int]:
+        """Work out the usage block for a prompt and update the cache"""
+        min_tokens = self.min_tokens if self.min_tokens is not None else min_cacheable_tokens(model)
+        digest = hashlib.sha256()
+        total_tokens = 0
+        breakpoints = []  # (key, tokens up to and including this segment)
+        for text, is_breakpoint in segments:
+            digest.update(text.encode('utf-8'))
+            digest.update(b'\x00')
+            total_tokens += estimate_tokens(text)
+            if is_breakpoint and self.enabled:
+                breakpoints.append((digest.hexdigest(), total_tokens))
+
+        read_tokens = 0
+        creation_tokens = 0
+        now = time.monotonic()
+        with self.lock:
+            cacheable = [(key, tokens) for key, tokens in breakpoints if tokens >= min_tokens]
+            # Longest prefix that is still cached
+            for key, tokens in reversed(cacheable):
+                if self.entries.get(key, 0) > now:
+                    read_tokens = tokens
+                    break
+            # Everything past the hit up to the last breakpoint is written
+            if cacheable and cacheable[-1][1] > read_tokens:
+                creation_tokens = cacheable[-1][1] - read_tokens
+            for key, tokens in cacheable:
+                if tokens <= read_tokens + creation_tokens:
+                    self.entries[key] = now + self.ttl
+
+            usage = {
+                'input_tokens': total_tokens - read_tokens - creation_tokens,
+                'cache_read_input_tokens': read_tokens,
+                'cache_creation_input_tokens': creation_tokens,
+            }
+            self.totals['requests'] += 1
+            for field, value in usage.items():
+                self.totals[field] += value
+        return usage
+
+
+class StandinHandler(BaseHTTPRequestHandler):
+    cache: PromptCache = None
+    base_latency = 0.0
+    per_token_latency = 0.0
+    cached_token_factor = 0.1
+
+    def do_POST(self):
+        if self.path.rstrip('/') != '/v1/messages':
+            self._send_json(404, {'type': 'error', 'error': {'type': 'not_found_error', 'message': self.path}})
+            return
+
+        length = int(self.headers.get('Content-Length', 0))
+        try:
+            request = json.loads(self.rfile.read(length) or b'{}')
+        except json.JSONDecodeError as e:
+            self._send_json(400, {'type': 'error', 'error': {'type': 'invalid_request_error', 'message': str(e)}})
+            return
+
+        usage = self.cache.usage_for(flatten_prompt(request), request.get('model', ''))
+        text = json.dumps(CANNED_ANSWER, indent=2)
+        usage['output_tokens'] = estimate_tokens(text)
+
+        # Uncached and newly written tokens are processed in full, cache reads
+        # only cost a fraction of that
+        processed = usage['input_tokens'] + usage['cache_creation_input_tokens']
+        time.sleep(self.base_latency
+                   + processed * self.per_token_latency
+                   + usage['cache_read_input_tokens'] * self.per_token_latency * self.cached_token_factor)
+
+        self._send_json(200, {
+            'id': f"msg_{uuid.uuid4().hex[:24]}",
+            'type': 'message',
+            'role': 'assistant',
+            'model': request.get('model', 'standin'),
+            'content': [{'type': 'text', 'text': text}],
+            'stop_reason': 'end_turn',
+            'stop_sequence': None,
+            'usage': usage,
+        })
+
+    def _send_json(self, status: int, payload: Dict[str, Any]):
+        body = json.dumps(payload).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, format, *args):
+        print(f"{self.address_string()} - {format % args}", file=sys.stderr)
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local Anthropic Messages API stand-in that models prompt caching')
+    parser.add_argument('--host', default='127.0.0.1', help='Address to bind')
+    parser.add_argument('--port', type=int, default=8765, help='Port to listen on')
+    parser.add_argument('--no-cache', action='store_true', help='Ignore cache_control (uncached baseline)')
+    parser.add_argument('--ttl', type=float, default=300, help='Cache entry lifetime in seconds (default: 300)')
+    parser.add_argument('--min-cache-tokens', type=int,
+                        help='Shortest prefix that can be cached (default: the API minimum of the '
+                             'requested model, 1024 tokens or 2048 for Haiku)')
+    parser.add_argument('--base-latency-ms', type=float, default=150,
+                        help='Fixed latency per request in milliseconds (default: 150)')
+    parser.add_argument('--per-token-latency-ms', type=float, default=0.05,
+                        help='Latency per processed input token in milliseconds (default: 0.05)')
+    args = parser.parse_args()
+
+    StandinHandler.cache = PromptCache(args.ttl, args.min_cache_tokens, enabled=not args.no_cache)
+    StandinHandler.base_latency = args.base_latency_ms / 1000
+    StandinHandler.per_token_latency = args.per_token_latency_ms / 1000
+
+    server = ThreadingHTTPServer((args.host, args.port), StandinHandler)
+    mode = 'disabled' if args.no_cache else 'enabled'
+    print(f"Anthropic stand-in listening on http://{args.host}:{args.port} (prompt cache {mode})")
+
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        print(json.dumps(StandinHandler.cache.totals, indent=2))
+
+    return 0
+
+
+if __name__ == '__main__':
+    exit(main())
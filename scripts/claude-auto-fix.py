@@ -14,10 +14,39 @@ from typing import Dict, List, Optional
 from github import Github
 import anthropic
 
+from prompt_cache import CacheUsage, cached_system, prefix_note
+
+MODEL = "claude-3-opus-20240229"
+
+# Stable prompt prefix shared by every issue; per-issue details go in the
+# user message. On its own it is far below the minimum cacheable length, so it
+# is cached together with the repository context.
+FIX_PLAN_INSTRUCTIONS = """You are an expert software engineer tasked with fixing a GitHub issue.
+
+You will be given the repository context followed by the issue title and
+description. Please analyze the issue and provide a detailed fix plan. Format
+your response as JSON:
+{
+    "analysis": "Brief analysis of the issue",
+    "fix_type": "bug|feature|refactor|documentation",
+    "complexity": "low|medium|high",
+    "files_to_modify": ["list", "of", "files"],
+    "implementation_steps": [
+        {
+            "step": 1,
+            "description": "What to do",
+            "code_changes": "Optional code snippet"
+        }
+    ],
+    "testing_required": true/false,
+    "test_plan": "How to test the fix"
+}"""
+
 class ClaudeAutoFixer:
     def __init__(self, github_token: str, anthropic_api_key: str):
         self.github = Github(github_token)
         self.anthropic = anthropic.Anthropic(api_key=anthropic_api_key)
+        self.usage = CacheUsage()
         
     def analyze_issue(self, repo_name: str, issue_number: int) -> Dict:
         """Fetch and analyze the GitHub issue"""
@@ -56,40 +85,31 @@ class ClaudeAutoFixer:
     
     def generate_fix_plan(self, issue_data: Dict) -> Dict:
         """Use Claude to generate a fix plan"""
-        prompt = f"""You are an expert software engineer tasked with fixing a GitHub issue.
-
-Repository: {issue_data['repo']['name']}
+        # Instructions plus repository context form one cached prefix. A run
+        # makes a single call, so it can only be read back by another run on
+        # the same repository within the cache TTL (e.g. a burst of labeled
+        # issues), and only if the context reaches the minimum length
+        repo_context = f"""Repository: {issue_data['repo']['name']}
 Main Language: {issue_data['repo']['language']}
 
-Issue Title: {issue_data['issue']['title']}
-Issue Description: {issue_data['issue']['body']}
-
 Repository Structure (top-level):
 {json.dumps(issue_data['repo']['structure'], indent=2)}
 
 Recent Changes:
-{json.dumps(issue_data['repo']['recent_changes'], indent=2)}
+{json.dumps(issue_data['repo']['recent_changes'], indent=2)}"""
 
-Please analyze this issue and provide a detailed fix plan. Format your response as JSON:
-{{
-    "analysis": "Brief analysis of the issue",
-    "fix_type": "bug|feature|refactor|documentation",
-    "complexity": "low|medium|high",
-    "files_to_modify": ["list", "of", "files"],
-    "implementation_steps": [
-        {{
-            "step": 1,
-            "description": "What to do",
-            "code_changes": "Optional code snippet"
-        }}
-    ],
-    "testing_required": true/false,
-    "test_plan": "How to test the fix"
-}}"""
+        note = prefix_note(MODEL, FIX_PLAN_INSTRUCTIONS, repo_context)
+        if note:
+            print(note)
+        
+        prompt = f"""Issue Title: {issue_data['issue']['title']}
+Issue Description: {issue_data['issue']['body']}"""
 
-        response = self.anthropic.messages.create(
-            model="claude-3-opus-20240229",
+        response = self.usage.create(
+            self.anthropic,
+            model=MODEL,
             max_tokens=2000,
+            system=cached_system(f"{FIX_PLAN_INSTRUCTIONS}\n\n{repo_context}"),
             messages=[{"role": "user", "content": prompt}]
         )
         
@@ -255,6 +275,7 @@ def main():
     # Create fixer and process issue
     fixer = ClaudeAutoFixer(github_token, anthropic_api_key)
     fixer.fix_issue(args.repo, args.issue_number)
+    print(fixer.usage.report())
     
     return 0
 
@@ -9,7 +9,7 @@ import json
 import subprocess
 import argparse
 from pathlib import Path
-from typing import List, Dict, Any
+from typing import List, Dict, Any, Optional
 
 try:
     import anthropic
@@ -18,19 +18,53 @@ except ImportError:
     print("Run: pip install anthropic")
     sys.exit(1)
 
-def get_codeql_results(sarif_file: str = None) -> List[Dict[str, Any]]:
-    """Parse CodeQL SARIF results"""
+from prompt_cache import CacheUsage, cached_system, prefix_note
+
+MODEL = "claude-3-sonnet-20241022"
+
+# Stable prompt prefix shared by every issue in a run, followed by the rule
+# reference built from the SARIF file. Keep per-issue details out of it so the
+# cached prefix is reused across the whole batch. The instructions alone are
+# far below the minimum cacheable length; the rule help is what makes the
+# prefix long enough to be cached.
+SECURITY_FIX_INSTRUCTIONS = """You are a security expert fixing CodeQL issues.
+
+For each issue you will be given the file, line, CodeQL rule, message, severity
+and the surrounding code, with >>> marking the problematic line. The CodeQL
+documentation of every rule reported in this run follows these instructions;
+use the recommendation of the issue's rule when choosing a fix.
+
+Please analyze the security issue and provide a fix. Consider:
+1. What is the security vulnerability?
+2. How can it be exploited?
+3. What is the secure way to fix it?
+
+Provide your response in this JSON format:
+{
+    "vulnerability": "Brief description of the security issue",
+    "impact": "Potential security impact",
+    "fix_explanation": "How to fix it",
+    "old_code": "The exact line(s) to replace",
+    "new_code": "The secure replacement code"
+}
+
+Important: Only include the minimal code changes needed. Keep the fix focused and don't change unrelated code."""
+
+def load_sarif(sarif_file: str = None) -> Optional[Dict[str, Any]]:
+    """Load a SARIF file, defaulting to the newest one below the current directory"""
     if not sarif_file:
         # Try to find the latest SARIF file
         sarif_files = list(Path('.').glob('**/*.sarif'))
         if not sarif_files:
             print("No SARIF files found")
-            return []
+            return None
         sarif_file = max(sarif_files, key=os.path.getctime)
     
     with open(sarif_file, 'r') as f:
-        sarif = json.load(f)
-    
+        return json.load(f)
+
+def get_codeql_results(sarif: Dict[str, Any]) -> List[Dict[str, Any]]:
+    """Parse CodeQL SARIF results"""
     issues = []
     for run in sarif.get('runs', []):
         for result in run.get('results', []):
@@ -54,6 +88,44 @@ def get_codeql_results(sarif_file: str = None) -> List[Dict[str, Any]]:
     
     return issues
 
+def get_rule_reference(sarif: Dict[str, Any]) -> str:
+    """Documentation of every rule that has results, from tool.driver.rules
+    and the query pack extensions, ordered by rule id"""
+    rules = {}
+    reported = set()
+    for run in sarif.get('runs', []):
+        tool = run.get('tool', {})
+        for component in [tool.get('driver', {})] + tool.get('extensions', []):
+            for rule in component.get('rules', []):
+                rules.setdefault(rule.get('id'), rule)
+        reported.update(result.get('ruleId') for result in run.get('results', []))
+    
+    sections = []
+    for rule_id in sorted(r for r in reported if r in rules):
+        rule = rules[rule_id]
+        properties = rule.get('properties', {})
+        lines = [f"### {rule_id}: {rule.get('shortDescription', {}).get('text', '')}".rstrip(': ')]
+        if rule.get('fullDescription', {}).get('text'):
+            lines.append(rule['fullDescription']['text'])
+        details = [
+            f"{name} {properties[key]}"
+            for name, key in (('severity', 'problem.severity'), ('security severity', 'security-severity'),
+                              ('precision', 'precision'))
+            if properties.get(key)
+        ]
+        if details:
+            lines.append('; '.join(details).capitalize())
+        if properties.get('tags'):
+            lines.append(f"Tags: {', '.join(properties['tags'])}")
+        help_text = rule.get('help', {}).get('markdown') or rule.get('help', {}).get('text')
+        if help_text:
+            lines.append(help_text.strip())
+        sections.append('\n'.join(lines))
+    
+    if not sections:
+        return ''
+    return "CodeQL rule reference:\n\n" + '\n\n'.join(sections)
+
 def get_file_context(file_path: str, line: int, context_lines: int = 10) -> str:
     """Get code context around a specific line"""
     try:
@@ -72,14 +144,13 @@ def get_file_context(file_path: str, line: int, context_lines: int = 10) -> str:
     except Exception as e:
         return f"Error reading file: {str(e)}"
 
-def fix_issue_with_claude(client: anthropic.Anthropic, issue: Dict[str, Any]) -> Dict[str, Any]:
+def fix_issue_with_claude(client: anthropic.Anthropic, issue: Dict[str, Any],
+                          usage: CacheUsage = None, rule_reference: str = '') -> Dict[str, Any]:
     """Use Claude to analyze and fix a security issue"""
     
     context = get_file_context(issue['file'], issue['line'])
     
-    prompt = f"""You are a security expert fixing CodeQL issues.
-
-File: {issue['file']}
+    prompt = f"""File: {issue['file']}
 Line: {issue['line']}
 Rule: {issue['rule']}
 Message: {issue['message']}
@@ -88,29 +159,15 @@ Severity: {issue['severity']}
 Code context (>>> marks the problematic line):
 ```
 {context}
-```
-
-Please analyze this security issue and provide a fix. Consider:
-1. What is the security vulnerability?
-2. How can it be exploited?
-3. What is the secure way to fix it?
-
-Provide your response in this JSON format:
-{{
-    "vulnerability": "Brief description of the security issue",
-    "impact": "Potential security impact",
-    "fix_explanation": "How to fix it",
-    "old_code": "The exact line(s) to replace",
-    "new_code": "The secure replacement code"
-}}
-
-Important: Only include the minimal code changes needed. Keep the fix focused and don't change unrelated code."""
+```"""
 
     try:
-        response = client.messages.create(
-            model="claude-3-sonnet-20241022",
+        response = (usage or CacheUsage()).create(
+            client,
+            model=MODEL,
             max_tokens=1500,
             temperature=0,
+            system=cached_system(f"{SECURITY_FIX_INSTRUCTIONS}\n\n{rule_reference}"),
             messages=[{"role": "user", "content": prompt}]
         )
         
@@ -180,7 +237,8 @@ def main():
     client = anthropic.Anthropic(api_key=api_key)
     
     # Get CodeQL issues
-    issues = get_codeql_results(args.sarif)
+    sarif = load_sarif(args.sarif)
+    issues = get_codeql_results(sarif) if sarif else []
     if not issues:
         print("No issues found in SARIF file")
         return
@@ -191,9 +249,17 @@ def main():
     issues_to_fix = issues[:args.limit]
     print(f"Processing {len(issues_to_fix)} issues...")
     
+    # Built from every reported rule, not just the processed ones, so the
+    # prefix stays the same across --limit batches of one SARIF file
+    rule_reference = get_rule_reference(sarif)
+    note = prefix_note(MODEL, SECURITY_FIX_INSTRUCTIONS, rule_reference)
+    if note:
+        print(note)
+    
     # Process each issue
     fixes_applied = []
     fixes_failed = []
+    usage = CacheUsage()
     
     for i, issue in enumerate(issues_to_fix, 1):
         print(f"\n[{i}/{len(issues_to_fix)}] Processing {issue['file']}:{issue['line']} - {issue['rule']}")
@@ -205,7 +271,7 @@ def main():
             continue
         
         # Get fix from Claude
-        result = fix_issue_with_claude(client, issue)
+        result = fix_issue_with_claude(client, issue, usage, rule_reference)
         
         if not result['success']:
             print(f"  Failed to get fix: {result['error']}")
@@ -237,11 +303,13 @@ def main():
     print(f"  Issues processed: {len(issues_to_fix)}")
     print(f"  Fixes applied: {len(fixes_applied)}")
     print(f"  Fixes failed: {len(fixes_failed)}")
+    print(usage.report())
     
     # Save results
     results = {
         'fixes_applied': fixes_applied,
-        'fixes_failed': fixes_failed
+        'fixes_failed': fixes_failed,
+        'usage': usage.to_dict()
     }
     
     with open('codeql_fixes_summary.json', 'w') as f:
@@ -0,0 +1,129 @@
+"""
+Prompt caching helpers shared by the Claude scripts
+
+The triage, auto-fix and CodeQL scripts all open their prompts with a block
+that never changes between calls (instructions, tool descriptions, the JSON
+response schema, CodeQL rule help). These helpers split each
+prompt into a stable prefix marked with a Messages API `cache_control`
+breakpoint and a per-item suffix, and keep track of how many input tokens
+were served from the cache during a run.
+
+The API only caches prefixes of at least MIN_CACHEABLE_TOKENS (more for
+Haiku); shorter ones are processed normally and report no cache tokens, so
+the scripts check their prefix with prefix_note() and say so.
+"""
+
+import math
+import time
+from typing import Any, Dict, List, Optional
+
+# Ephemeral is the only cache type the Messages API supports (5 minute TTL,
+# refreshed on every hit).
+CACHE_CONTROL = {"type": "ephemeral"}
+
+# Shortest prefix the API caches, in tokens
+MIN_CACHEABLE_TOKENS = 1024
+MIN_CACHEABLE_TOKENS_HAIKU = 2048
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token count (about four characters per token)"""
+    return math.ceil(len(text) / 4)
+
+
+def min_cacheable_tokens(model: str) -> int:
+    return MIN_CACHEABLE_TOKENS_HAIKU if 'haiku' in model else MIN_CACHEABLE_TOKENS
+
+
+def prefix_note(model: str, *sections: str) -> Optional[str]:
+    """Explain why a prefix will not be cached, or None if it is long enough"""
+    tokens = estimate_tokens(''.join(section.strip() for section in sections if section))
+    minimum = min_cacheable_tokens(model)
+    if tokens >= minimum:
+        return None
+    return (f"Note: the cached prompt prefix is about {tokens} tokens, below the {minimum}-token "
+            f"minimum for {model}; calls are processed without caching")
+
+
+def cached_block(text: str) -> Dict[str, Any]:
+    """Build a text block that ends a cacheable prefix"""
+    return {"type": "text", "text": text.strip(), "cache_control": dict(CACHE_CONTROL)}
+
+
+def cached_system(*sections: str) -> List[Dict[str, Any]]:
+    """Build a system prompt where every section is its own cache breakpoint
+
+    Sections should be ordered from most to least stable so that a change in a
+    later section does not invalidate the cached earlier ones.
+    """
+    return [cached_block(section) for section in sections if section and section.strip()]
+
+
+class CacheUsage:
+    """Accumulates token usage and latency over the Claude calls of one run"""
+
+    def __init__(self):
+        self.requests = 0
+        self.input_tokens = 0
+        self.output_tokens = 0
+        self.cache_read_input_tokens = 0
+        self.cache_creation_input_tokens = 0
+        self.latency_seconds = 0.0
+
+    def create(self, client, **kwargs):
+        """Call client.messages.create and record the usage of the response"""
+        start = time.perf_counter()
+        response = client.messages.create(**kwargs)
+        self.record(response, time.perf_counter() - start)
+        return response
+
+    def record(self, response, elapsed: float = 0.0):
+        """Record the usage block of a Messages API response"""
+        usage = getattr(response, 'usage', None)
+        self.requests += 1
+        self.latency_seconds += elapsed
+        if usage is None:
+            return
+        # Cache fields are None (not missing) when caching was not used
+        self.input_tokens += getattr(usage, 'input_tokens', 0) or 0
+        self.output_tokens += getattr(usage, 'output_tokens', 0) or 0
+        self.cache_read_input_tokens += getattr(usage, 'cache_read_input_tokens', 0) or 0
+        self.cache_creation_input_tokens += getattr(usage, 'cache_creation_input_tokens', 0) or 0
+
+    @property
+    def total_input_tokens(self) -> int:
+        """All prompt tokens, whether processed, written to or read from the cache"""
+        return self.input_tokens + self.cache_read_input_tokens + self.cache_creation_input_tokens
+
+    @property
+    def cache_hit_rate(self) -> float:
+        """Fraction of prompt tokens that were served from the cache"""
+        total = self.total_input_tokens
+        return self.cache_read_input_tokens / total if total else 0.0
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            'requests': self.requests,
+            'input_tokens': self.input_tokens,
+            'output_tokens': self.output_tokens,
+            'cache_read_input_tokens': self.cache_read_input_tokens,
+            'cache_creation_input_tokens': self.cache_creation_input_tokens,
+            'total_input_tokens': self.total_input_tokens,
+            'cache_hit_rate': round(self.cache_hit_rate, 4),
+            'latency_seconds': round(self.latency_seconds, 3),
+            'mean_latency_seconds': round(self.latency_seconds / self.requests, 3) if self.requests else 0.0,
+        }
+
+    def report(self) -> str:
+        """Human readable summary for the end of a run"""
+        stats = self.to_dict()
+        return '\n'.join([
+            "Prompt cache usage:",
+            f"  Requests: {stats['requests']}",
+            f"  Input tokens (uncached): {stats['input_tokens']}",
+            f"  Cache write tokens: {stats['cache_creation_input_tokens']}",
+            f"  Cache read tokens: {stats['cache_read_input_tokens']}",
+            f"  Cache hit rate: {stats['cache_hit_rate']:.1%}",
+            f"  Total latency: {stats['latency_seconds']:.2f}s "
+            f"(mean {stats['mean_latency_seconds']:.2f}s)",
+        ])